@@ -1,14 +1,15 @@
 import streamlit as st
 import pandas as pd
 import os
+import re
 from pathlib import Path
 import numpy as np
-from scipy.interpolate import interp1d
-from sklearn.preprocessing import LabelEncoder
 import itertools
 import datetime
 import plotly.graph_objects as go
 from pywt import wavedec
+from CondaEngine import (CSV_ENGINES, LAYOUT_DAR, LAYOUT_PLAIN, NORMALIZED_SUFFIX, calculate_limited_param_stats, convert_elements, dar_store,
+                         list_data_files, load_frame, normalize_file, parse_quantiles)
 
 
 # 设置标题和作者
@@ -16,70 +17,57 @@ st.title("DAR处理平台")
 # 创建侧边栏
 sidebar = st.sidebar.radio("设置", ["数据处理", "数据应用"])
 st.sidebar.markdown("作者: 周福来")
+# 列式存储：每个文件只解析一次，之后只读取需要的列；文件修改时间或大小变化时重新导入
+data_store = dar_store if st.sidebar.checkbox("使用列式存储", value=True) else None
+# 源文件已删除或移动的存储在每次限定参数计算后清理，也可随时手动清理
+if st.sidebar.button("清理列式存储"):
+    st.sidebar.success(f"已清理 {dar_store.prune()} 个源文件已不存在的存储")
+# 读取选项：压缩数据类型（浮点列 float32、离散字转为分类）减少内存；pyarrow 引擎多线程解析 CSV
+compact_dtypes = st.sidebar.checkbox("压缩数据类型", value=False)
+csv_engine = st.sidebar.selectbox("CSV解析引擎", CSV_ENGINES)
+# 限定参数计算时同时处理的文件数
+processing_workers = int(st.sidebar.number_input("并行进程数", min_value=1, max_value=os.cpu_count() or 1, value=os.cpu_count() or 1))
 
 
 def convert_elements_type(elements, target_type, file_path, param_name):
     
     try:
-        if isinstance(elements, list):
-            converted_elements = [target_type(x) for x in elements]
-        else:
-            converted_elements = target_type(elements)
-     
-        if not isinstance(converted_elements, list):
-            converted_elements = [converted_elements]
-        return converted_elements
+        return convert_elements(elements, target_type)
     except ValueError:
         st.error(f"无法将输入的限定参数元素转换为 {target_type.__name__} 类型，请检查输入的数据类型，文件路径：{file_path}，限定参数名称：{param_name}")
         return None
 
-def calculate_with_limited_param(input_folder_path, param_name, limited_param_name, limited_param_elements):
-    results = []
+def valid_quantiles(text):
+    try:
+        parse_quantiles(text)
+        return True
+    except ValueError:
+        return False
+
+def valid_pattern(pattern):
+    try:
+        re.compile(pattern)
+        return True
+    except re.error:
+        return False
+
+def calculate_with_limited_param(input_folder_path, param_name, limited_param_name, limited_param_elements, store, downcast, engine, workers,
+                                 group_param_name=None, tail_pattern=None, quantiles=()):
     input_folder = Path(input_folder_path)
-    limited_param_elements = [limited_param_elements]  # 确保是列表
 
     # 检查文件夹路径是否存在
     if not input_folder.exists():
         st.error(f"输入的文件夹路径 {input_folder_path} 不存在，请重新输入。")
-        return results
-
-    for file_path in input_folder.glob('*.*'):
-        if file_path.suffix.lower() in ['.csv', '.xlsx']:
-            try:
-                if file_path.suffix.lower() == '.csv':
-                    data = pd.read_csv(file_path, skiprows=[0, 1, 2, 3, 4, 5, 6, 8, 9, 10], encoding='gbk', low_memory=False)
-                else:
-                    data = pd.read_excel(file_path)
-
-                # 检查限定参数名称和查找参数名称对应的列是否存在
-                if limited_param_name not in data.columns:
-                    st.error(f"在文件 {file_path.name} 中未找到限定参数列 {limited_param_name}，请检查输入的限定参数名称是否正确，文件路径：{file_path}")
-                    continue
-                if param_name not in data.columns:
-                    st.error(f"在文件 {file_path.name} 中未找到查找参数名称列 {param_name}，请检查输入的查找参数名称是否正确，文件路径：{file_path}")
-                    continue
-
-                limited_param_col = data[limited_param_name]
-                # 获取限定参数列的第一个元素的数据类型作为目标类型
-                target_type = type(limited_param_col.iloc[0])
-                # 转换限定参数元素的数据类型
-                converted_elements = convert_elements_type(limited_param_elements, target_type, file_path, limited_param_name)
-                if converted_elements is None:
-                    continue
-
-                filtered_data = data[data[limited_param_name].isin(converted_elements)]
-                if not filtered_data.empty:
-                    element_stats = {
-                        "文件名": file_path.name,
-                        "平均值": filtered_data[param_name].mean(),
-                        "最大值": filtered_data[param_name].max(),
-                        "最小值": filtered_data[param_name].min(),
-                        "方差": filtered_data[param_name].var()
-                    }
-                    results.append(element_stats)
-            except Exception as e:
-                print(f"处理文件 {file_path} 时出错: {e}")
-                st.error(f"处理文件 {file_path} 时出现异常，请检查文件格式或数据内容是否正确，具体错误信息: {e}，文件路径：{file_path}")
+        return []
+
+    # 各文件按并行进程数独立读取与筛选，结果按文件名顺序合并，出错的文件在全部处理完成后统一提示
+    results, errors = calculate_limited_param_stats(
+        input_folder, param_name, limited_param_name, limited_param_elements, store, downcast, engine, workers, group_param_name, tail_pattern, quantiles,
+    )
+    for error in errors:
+        st.error(error)
+    if store is not None:
+        store.prune()
     return results
 
 
@@ -90,19 +78,17 @@ def draw_graph(folder_path, selected_column, filter_column=None, filter_min=None
     if not os.path.exists(folder_path):
         st.error(f"输入的文件夹路径 {folder_path} 不存在，请重新输入。")
         return
-    for filename in os.listdir(folder_path):
-        if filename.endswith('.csv') or filename.endswith('.xlsx'):
-            file_path = os.path.join(folder_path, filename)
-            try:
-                df = pd.read_csv(file_path) if filename.endswith('.csv') else pd.read_excel(file_path)
-                if selected_column in df.columns:
-                    filtered_df = df
-                    if filter_column in df.columns and filter_min is not None and filter_max is not None:
-                        filtered_df = df[(df[filter_column] >= filter_min) & (df[filter_column] <= filter_max)]
-                    fig.add_trace(go.Scatter(x=filtered_df.index, y=filtered_df[selected_column], mode='lines', name=os.path.basename(filename)))
-            except Exception as e:
-                print(f"Error reading file {file_path}: {e}")
-                st.error(f"读取文件 {file_path} 时出错，请检查文件格式或权限等问题，具体错误信息: {e}")
+    for file_path in list_data_files(folder_path):
+        try:
+            df = load_frame(file_path, [selected_column, filter_column], LAYOUT_PLAIN, data_store, compact_dtypes, csv_engine)
+            if selected_column in df.columns:
+                filtered_df = df
+                if filter_column in df.columns and filter_min is not None and filter_max is not None:
+                    filtered_df = df[(df[filter_column] >= filter_min) & (df[filter_column] <= filter_max)]
+                fig.add_trace(go.Scatter(x=filtered_df.index, y=filtered_df[selected_column], mode='lines', name=file_path.name))
+        except Exception as e:
+            print(f"Error reading file {file_path}: {e}")
+            st.error(f"读取文件 {file_path} 时出错，请检查文件格式或权限等问题，具体错误信息: {e}")
     if fig.data:  # 检查是否有数据轨迹添加到图形中
         fig.update_layout(title=f'Distribution Plot of {selected_column} for Different Files', xaxis_title='Data Point Index', yaxis_title=selected_column)
         st.plotly_chart(fig)
@@ -113,13 +99,11 @@ def draw_graph(folder_path, selected_column, filter_column=None, filter_min=None
 # 定义快速傅里叶变换函数
 def fast_fourier_transform(folder_path, param_name):
     all_data = []
-    for filename in os.listdir(folder_path):
-        if filename.endswith('.csv') or filename.endswith('.xlsx'):
-            file_path = os.path.join(folder_path, filename)
-            df = pd.read_csv(file_path) if filename.endswith('.csv') else pd.read_excel(file_path)
-            if param_name in df.columns:
-                data = df[param_name].values
-                all_data.extend(data)
+    for file_path in list_data_files(folder_path):
+        df = load_frame(file_path, [param_name], LAYOUT_PLAIN, data_store, compact_dtypes, csv_engine)
+        if param_name in df.columns:
+            data = df[param_name].values
+            all_data.extend(data)
     if all_data:
         fft_result = np.fft.fft(all_data)
         freq = np.fft.fftfreq(len(all_data))
@@ -133,13 +117,11 @@ def fast_fourier_transform(folder_path, param_name):
 # 定义小波变换函数
 def wavelet_transform(folder_path, param_name):
     all_data = []
-    for filename in os.listdir(folder_path):
-        if filename.endswith('.csv') or filename.endslant('.xlsx'):
-            file_path = os.path.join(folder_path, filename)
-            df = pd.read_csv(file_path) if filename.endswith('.csv') else pd.read_excel(file_path)
-            if param_name in df.columns:
-                data = df[param_name].values
-                all_data.extend(data)
+    for file_path in list_data_files(folder_path):
+        df = load_frame(file_path, [param_name], LAYOUT_PLAIN, data_store, compact_dtypes, csv_engine)
+        if param_name in df.columns:
+            data = df[param_name].values
+            all_data.extend(data)
     if all_data:
         coeffs = wavedec(all_data, 'db1', level=1)
         cA, cD = coeffs[0], coeffs[-1]
@@ -214,57 +196,12 @@ if sidebar == "数据处理":
     compare_param_name = st.text_input("对比参数名称") if use_compare_param else None
     
     def process_and_normalize(input_file_path, target_rows, output_file_path):
-        # 根据文件扩展名读取文件
-        if input_file_path.endswith('.csv'):
-            data = pd.read_csv(input_file_path, skiprows=[0, 1, 2, 3, 4, 5, 6, 8, 9, 10], encoding='gbk', low_memory=False)
-        elif input_file_path.endswith(('.xlsx', '.xls')):
-            data = pd.read_excel(input_file_path)
-        else:
-            raise ValueError("Unsupported file format. Please use CSV or Excel files.")
-
-        # 区分数值列和离散文本列
-        numeric_columns = data.select_dtypes(include=['number']).columns
-        discrete_columns = data.select_dtypes(include=['object']).columns
-
-        # 处理数值列，填充缺失值（先前向填充，再后向填充）
-        numeric_data = data[numeric_columns].ffill().bfill()
-
-        # 处理离散数据（编码），每一列都重新开始
-        discrete_data = data[discrete_columns]
-        for col in discrete_columns:
-            le = LabelEncoder()
-            discrete_data[col] = discrete_data[col].ffill().bfill()
-            discrete_data[col] = le.fit_transform(discrete_data[col])
-
-        # 合并处理后的数据
-        processed_data = pd.concat([discrete_data, numeric_data], axis=1)
-
-        # 转换为NumPy数组以便进行“归一化”（实际上是插值）
-        x = processed_data.values
-        idx = np.arange(x.shape[0])
-
-        # 使用一维插值进行“归一化”（实际上是重新采样）
-        f = interp1d(idx, x, axis=0, fill_value='extrapolate')
-        idx_new = np.linspace(0, idx.max(), target_rows)
-        x_new = f(idx_new)
-
-        # 将处理后的数据转换回DataFrame
-        df_resampled = pd.DataFrame(x_new, columns=processed_data.columns)
-
-        # 保存到输出文件
-        if output_file_path.endswith('.csv'):
-            df_resampled.to_csv(output_file_path, index=False)
-        elif output_file_path.endswith(('.xlsx', '.xls')):
-            df_resampled.to_excel(output_file_path, index=False)
-        else:
-            raise ValueError("Unsupported file format for output. Please use CSV or Excel files.")
+        # 按列分块重新采样（数值列线性插值、离散列取最近行），结果写为 Feather 文件
+        normalize_file(input_file_path, target_rows, output_file_path, data_store, csv_engine)
 
     def calculate_compared_params(file_path, param_name, compare_param_name, limited_param_name=None, limited_param_elements=None):
         try:
-            if file_path.suffix.lower() == '.csv':
-                data = pd.read_csv(file_path, skiprows=[0, 1, 2, 3, 4, 5, 6, 8, 9, 10], encoding='gbk', low_memory=False)
-            else:
-                data = pd.read_excel(file_path)
+            data = load_frame(file_path, [param_name, compare_param_name, limited_param_name], LAYOUT_DAR, data_store, compact_dtypes, csv_engine)
             if param_name in data.columns and compare_param_name in data.columns:
                 # 先根据限定参数进行筛选（如果有限定参数相关配置）
                 if limited_param_name and limited_param_elements:
@@ -292,7 +229,7 @@ if sidebar == "数据处理":
 
             for filename in input_folder.glob('*.csv'):
                 input_file_path = filename
-                norm_file_path = norm_folder / f"{filename.stem}_norm.csv"
+                norm_file_path = norm_folder / f"{filename.stem}_norm{NORMALIZED_SUFFIX}"
 
                 try:
                     process_and_normalize(str(input_file_path), int(target_rows), str(norm_file_path))
@@ -302,10 +239,9 @@ if sidebar == "数据处理":
 
             for filename in input_folder.glob('*.xlsx'):
                 input_file_path = filename
-                norm_file_path = norm_folder / f"{filename.stem}_norm.xlsx"
+                norm_file_path = norm_folder / f"{filename.stem}_norm{NORMALIZED_SUFFIX}"
 
                 try:
-                    data = pd.read_excel(input_file_path)
                     process_and_normalize(str(input_file_path), int(target_rows), str(norm_file_path))
                     print(f"文件 {input_file_path} 归一化处理完成，保存到 {norm_file_path}")
                 except Exception as e:
@@ -317,6 +253,10 @@ if sidebar == "数据处理":
 
     limited_param_name = st.text_input("限定参数名称（既定横坐标参数名称）") if use_limited_param else None
     limited_param_elements = st.text_input("限定参数元素（既定横坐标参数下的元素）") if use_limited_param else None
+    # 汇总选项：各文件的统计量合并为机队合计，并可按分组参数（如飞行阶段）的取值、按文件名中的机号汇总
+    group_param_name = st.text_input("分组参数名称（如飞行阶段，可选）") if use_limited_param else None
+    tail_pattern = st.text_input("机号文件名规则（正则表达式，可选）") if use_limited_param else None
+    quantile_text = st.text_input("分位数（逗号分隔，如 0.5,0.95，可选）") if use_limited_param else None
 
     if st.button("绘制参数图"):
         if norm_output_folder:
@@ -333,16 +273,15 @@ if sidebar == "数据处理":
         if input_folder_path and param_name and compare_param_name:
             input_folder = Path(input_folder_path)
             results = []
-            for file_path in input_folder.glob('*.*'):
-                if file_path.suffix.lower() in ['.csv', '.xlsx']:
-                    result = calculate_compared_params(file_path, param_name, compare_param_name, limited_param_name, limited_param_elements)
-                    if result is not None:
-                        results.append(result)
-                        st.subheader(f"文件：{file_path.name} 的对比参数计算结果")
-                        st.dataframe(result)
-                        fig = go.Figure(data=[go.Scatter(x=result.index, y=result['差值'], mode='lines', name='差值')])
-                        fig.update_layout(title=f'文件：{file_path.name} 对比参数差值图', xaxis_title='Data Point Index', yaxis_title='差值')
-                        st.plotly_chart(fig)
+            for file_path in list_data_files(input_folder):
+                result = calculate_compared_params(file_path, param_name, compare_param_name, limited_param_name, limited_param_elements)
+                if result is not None:
+                    results.append(result)
+                    st.subheader(f"文件：{file_path.name} 的对比参数计算结果")
+                    st.dataframe(result)
+                    fig = go.Figure(data=[go.Scatter(x=result.index, y=result['差值'], mode='lines', name='差值')])
+                    fig.update_layout(title=f'文件：{file_path.name} 对比参数差值图', xaxis_title='Data Point Index', yaxis_title='差值')
+                    st.plotly_chart(fig)
             if not results:
                 st.error("未找到符合条件的数据，请检查输入参数是否正确")
         else:
@@ -361,8 +300,15 @@ if sidebar == "数据处理":
             st.error("请输入有效的限定参数名称（既定横坐标参数名称），当前名称为空，请重新输入。")
         elif not limited_param_elements:
             st.error("请输入有效的限定参数元素（既定横坐标参数下的元素），当前元素为空，请重新输入。")
+        elif not valid_quantiles(quantile_text):
+            st.error("请输入有效的分位数，多个分位数用逗号分隔，每个分位数需在 0 到 1 之间。")
+        elif tail_pattern and not valid_pattern(tail_pattern):
+            st.error("请输入有效的机号文件名规则（正则表达式）。")
         else:
-            calculation_results = calculate_with_limited_param(input_folder_path, param_name, limited_param_name, limited_param_elements)
+            calculation_results = calculate_with_limited_param(
+                input_folder_path, param_name, limited_param_name, limited_param_elements, data_store, compact_dtypes, csv_engine, processing_workers,
+                group_param_name or None, tail_pattern or None, parse_quantiles(quantile_text),
+            )
             if calculation_results:
                 result_df = pd.DataFrame(calculation_results)
                 st.dataframe(result_df)
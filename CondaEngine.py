@@ -0,0 +1,686 @@
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# DAR 飞行数据的读取与列式存储（不依赖 Streamlit，可被 Conda.py 及其他脚本导入）
+# pyarrow 只在读写列式存储或使用 pyarrow 解析引擎时导入
+
+# 参与处理的文件类型
+DATA_FILE_SUFFIXES = ('.csv', '.xlsx', '.feather')
+# DAR 原始 CSV：第 8 行为参数名称，其余前 11 行为文件信息与单位等说明
+DAR_CSV_SKIPROWS = [0, 1, 2, 3, 4, 5, 6, 8, 9, 10]
+DAR_CSV_ENCODING = 'gbk'
+# 数据从第 12 行开始（pyarrow 解析引擎不支持跳过不连续的行，按列名与起始行读取）
+DAR_CSV_DATA_START = 11
+# CSV 解析引擎：c 为 pandas 默认引擎；pyarrow 多线程解析，适合参数多、行数多的文件
+CSV_ENGINES = ["c", "pyarrow"]
+# 压缩数据类型时，取值种类不超过行数此比例的文本列转换为分类类型
+CATEGORY_MAX_RATIO = 0.5
+# 分位数摘要（t-digest）的压缩参数：质心数约为此值，越大分位数越精确
+DIGEST_COMPRESSION = 200
+# 归一化（重新采样）时每次处理的列数：内存占用约为 行数 × 此值 × 8 字节，与文件的参数总数无关
+NORMALIZE_BLOCK_COLUMNS = 64
+# 归一化输出文件的扩展名（Feather，即 Arrow IPC，可按列以内存映射方式读取）
+NORMALIZED_SUFFIX = '.feather'
+# 读取格式：DAR 原始文件，或首行为列名的普通表格（归一化输出、数据应用页面的文件夹）
+LAYOUT_DAR = "dar"
+LAYOUT_PLAIN = "plain"
+# 进程池的启动方式：Streamlit 进程中有多个线程，fork 出的子进程可能因其他线程持有的锁而死锁
+PROCESS_START_METHOD = "spawn"
+# 列式存储目录
+DAR_STORE_DIR = Path(tempfile.gettempdir()) / "dar_store"
+# 限定参数统计每次读取并累计的行数：每个文件的峰值内存只与此值有关，与文件行数无关
+STATS_CHUNK_ROWS = 65536
+
+
+@lru_cache(maxsize=4096)
+def _header(path, mtime_ns, size, layout):
+    if Path(path).suffix.lower() == '.feather':
+        import pyarrow.ipc as ipc
+
+        return tuple(ipc.open_file(path).schema.names)
+    if Path(path).suffix.lower() != '.csv':
+        return tuple(pd.read_excel(path, nrows=0).columns)
+    if layout == LAYOUT_DAR:
+        return tuple(pd.read_csv(path, skiprows=DAR_CSV_SKIPROWS, encoding=DAR_CSV_ENCODING, nrows=0).columns)
+    return tuple(pd.read_csv(path, nrows=0).columns)
+
+
+def read_header(file_path, layout=LAYOUT_DAR):
+    """文件的列名（只解析表头，文件未变化时只解析一次）"""
+    stat = Path(file_path).stat()
+    return _header(str(Path(file_path).resolve()), stat.st_mtime_ns, stat.st_size, layout)
+
+
+def _read_csv_pyarrow(file_path, header, usecols, layout):
+    import pyarrow.csv as pa_csv
+
+    if layout == LAYOUT_DAR:
+        read_options = pa_csv.ReadOptions(skip_rows=DAR_CSV_DATA_START, column_names=list(header), encoding=DAR_CSV_ENCODING)
+    else:
+        read_options = pa_csv.ReadOptions(skip_rows=1, column_names=list(header))
+    convert_options = pa_csv.ConvertOptions(include_columns=usecols) if usecols is not None else None
+    return pa_csv.read_csv(file_path, read_options=read_options, convert_options=convert_options).to_pandas()
+
+
+def read_columns(file_path, columns=None, layout=LAYOUT_DAR, downcast=False, engine="c"):
+    """只解析需要的列（None 表示全部列，文件中没有的列忽略），返回的列按 columns 的顺序排列
+
+    Feather 文件（如归一化输出）与读取格式无关，按列以内存映射方式读取。
+    downcast 为 True 时压缩数据类型（见 downcast_frame）；engine 为 CSV 解析引擎（见 CSV_ENGINES）。
+    """
+    file_path = Path(file_path)
+    usecols = None
+    if columns is not None:
+        header = read_header(file_path, layout)
+        usecols = [column for column in dict.fromkeys(columns) if column in header]
+    if file_path.suffix.lower() == '.feather':
+        import pyarrow.feather as feather
+
+        df = feather.read_table(file_path, columns=usecols, memory_map=True).to_pandas()
+    elif file_path.suffix.lower() != '.csv':
+        df = pd.read_excel(file_path, usecols=usecols)
+    elif engine == "pyarrow":
+        df = _read_csv_pyarrow(file_path, read_header(file_path, layout), usecols, layout)
+    elif layout == LAYOUT_DAR:
+        df = pd.read_csv(file_path, skiprows=DAR_CSV_SKIPROWS, encoding=DAR_CSV_ENCODING, low_memory=False, usecols=usecols)
+    else:
+        df = pd.read_csv(file_path, usecols=usecols)
+    if usecols is not None:
+        df = df[usecols]
+    return downcast_frame(df) if downcast else df
+
+
+def downcast_frame(df, categorize=True):
+    """压缩数据类型：浮点列转为 float32，取值种类较少的文本列（离散字）转为分类类型，整数列保持不变
+
+    categorize 为 False 时只压缩浮点列（按块读取时是否转为分类类型取决于各块的取值，各块会不一致）。
+    """
+    df = df.copy()
+    for position, dtype in enumerate(df.dtypes):
+        values = df.iloc[:, position]
+        if dtype == np.float64:
+            df.isetitem(position, values.astype(np.float32))
+        elif categorize and (pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)):
+            if values.nunique() <= CATEGORY_MAX_RATIO * len(values):
+                df.isetitem(position, values.astype("category"))
+    return df
+
+
+def read_source(file_path, layout=LAYOUT_DAR, engine="c"):
+    """按读取格式完整解析一个 csv/xlsx 文件"""
+    return read_columns(file_path, None, layout, engine=engine)
+
+
+def list_data_files(folder_path, suffixes=DATA_FILE_SUFFIXES):
+    """文件夹中需要处理的文件，按文件名排序"""
+    return sorted(path for path in Path(folder_path).iterdir() if path.is_file() and path.suffix.lower() in suffixes)
+
+
+class DarStore:
+    """DAR 文件的列式存储：每个源文件只解析一次，之后按需要的列以内存映射方式读取
+
+    每个源文件（绝对路径 + 读取格式）对应一个未压缩的 Feather（Arrow IPC）文件和一个清单文件，
+    清单记录源文件的修改时间、大小与列名；修改时间或大小变化时重新导入。
+    无法转换为 Arrow 的表（如同列混合数字与文本）只在清单中记录，每次直接读取源文件。
+    文件均先写临时文件再替换，多个进程可同时读写同一存储目录。
+    """
+
+    def __init__(self, directory=DAR_STORE_DIR):
+        self.directory = Path(directory)
+
+    @staticmethod
+    def key(file_path, layout=LAYOUT_DAR):
+        return hashlib.sha1(f"{layout}\x00{Path(file_path).resolve()}".encode("utf-8", "surrogatepass")).hexdigest()
+
+    def _paths(self, key):
+        return self.directory / f"{key}.feather", self.directory / f"{key}.json"
+
+    @staticmethod
+    def _signature(file_path):
+        stat = Path(file_path).stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def manifest(self, file_path, layout=LAYOUT_DAR):
+        """源文件未变化时返回清单（source、layout、mtime_ns、size、columns、stored），否则返回 None"""
+        _, manifest_path = self._paths(self.key(file_path, layout))
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if (manifest["mtime_ns"], manifest["size"]) != self._signature(file_path):
+            return None
+        return manifest
+
+    def ingest(self, file_path, layout=LAYOUT_DAR, engine="c"):
+        """解析源文件并写入列式存储，返回 (清单, 解析得到的 DataFrame)"""
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        mtime_ns, size = self._signature(file_path)
+        df = read_source(file_path, layout, engine)
+        data_path, manifest_path = self._paths(self.key(file_path, layout))
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stored = all(isinstance(column, str) for column in df.columns)
+        if stored:
+            try:
+                feather.write_feather(df, data_path.with_suffix(suffix), compression="uncompressed")
+                os.replace(data_path.with_suffix(suffix), data_path)
+            except (pa.ArrowException, ValueError, TypeError, OSError):
+                data_path.with_suffix(suffix).unlink(missing_ok=True)
+                stored = False
+        if not stored:
+            data_path.unlink(missing_ok=True)
+        manifest = {
+            "source": str(Path(file_path).resolve()),
+            "layout": layout,
+            "mtime_ns": mtime_ns,
+            "size": size,
+            "rows": len(df),
+            "columns": [str(column) for column in df.columns],
+            "stored": stored,
+        }
+        manifest_path.with_suffix(suffix).write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        os.replace(manifest_path.with_suffix(suffix), manifest_path)
+        return manifest, df
+
+    def read(self, file_path, columns=None, layout=LAYOUT_DAR, engine="c"):
+        """读取源文件中的指定列（None 表示全部列），文件中没有的列忽略；源文件变化或尚未导入时先导入（engine 为导入时的解析引擎）"""
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        manifest = self.manifest(file_path, layout)
+        if manifest is None:
+            _, df = self.ingest(file_path, layout, engine)
+            return _select_columns(df, columns)
+        if not manifest["stored"]:
+            return read_columns(file_path, columns, layout, engine=engine)
+        available = set(manifest["columns"])
+        selected = None if columns is None else [column for column in dict.fromkeys(columns) if column in available]
+        data_path, _ = self._paths(self.key(file_path, layout))
+        try:
+            table = feather.read_table(data_path, columns=selected, memory_map=True)
+        except (FileNotFoundError, pa.ArrowInvalid):
+            _, df = self.ingest(file_path, layout, engine)
+            return _select_columns(df, columns)
+        return _arrow_frame(table)
+
+    def iter_read(self, file_path, columns=None, layout=LAYOUT_DAR, engine="c", chunk_rows=STATS_CHUNK_ROWS):
+        """按行分块读取指定列（与 read 相同的列选择）；已写入存储时按记录批以内存映射方式读取，每块只载入这些列
+
+        尚未导入或源文件变化时先导入，导入时整表解析一次。
+        """
+        manifest = self.manifest(file_path, layout)
+        if manifest is None:
+            manifest, df = self.ingest(file_path, layout, engine)
+            yield from _frame_slices(_select_columns(df, columns), chunk_rows)
+            return
+        if not manifest["stored"]:
+            yield from iter_frame_chunks(file_path, columns, layout, None, engine=engine, chunk_rows=chunk_rows)
+            return
+        available = set(manifest["columns"])
+        selected = manifest["columns"] if columns is None else [column for column in dict.fromkeys(columns) if column in available]
+        data_path, _ = self._paths(self.key(file_path, layout))
+        yield from _iter_feather(data_path, selected, chunk_rows)
+
+    def prune(self):
+        """删除源文件已不存在的存储文件与清单，返回删除的源文件数
+
+        源文件修改后重新导入时覆盖原有的存储文件，因此只有删除或移动过的源文件会留下无用的存储。
+        """
+        removed = 0
+        for manifest_path in self.directory.glob("*.json"):
+            try:
+                source = json.loads(manifest_path.read_text(encoding="utf-8"))["source"]
+            except (FileNotFoundError, ValueError, KeyError):
+                continue
+            if not Path(source).exists():
+                manifest_path.with_suffix(".feather").unlink(missing_ok=True)
+                manifest_path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+
+def _arrow_frame(table):
+    df = table.to_pandas()
+    # Arrow 的空值在文本列中还原为 None，改回 pd.read_csv 的 NaN
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].where(df[column].notna(), np.nan)
+    return df
+
+
+def _frame_slices(df, chunk_rows):
+    """按行切分已载入的表，空表也返回一块（保留列名）"""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _iter_feather(path, columns, chunk_rows):
+    """以内存映射方式按记录批读取 Feather 文件中的指定列，过大的记录批再按 chunk_rows 切分"""
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    with pa.memory_map(str(path)) as source:
+        reader = ipc.open_file(source)
+        yielded = False
+        for position in range(reader.num_record_batches):
+            batch = reader.get_batch(position).select(columns)
+            for start in range(0, batch.num_rows, chunk_rows):
+                yielded = True
+                yield _arrow_frame(pa.Table.from_batches([batch.slice(start, chunk_rows)]))
+        if not yielded:
+            yield _arrow_frame(reader.schema.empty_table().select(columns))
+
+
+def _select_columns(df, columns):
+    if columns is None:
+        return df
+    return df[[column for column in dict.fromkeys(columns) if column in df.columns]]
+
+
+dar_store = DarStore()
+
+
+def load_frame(file_path, columns=None, layout=LAYOUT_DAR, store=dar_store, downcast=False, engine="c"):
+    """读取文件中的指定列，文件中没有的列忽略；store 为 None 或文件本身为 Feather 时直接从源文件只读取这些列"""
+    if store is None or Path(file_path).suffix.lower() == '.feather':
+        return read_columns(file_path, columns, layout, downcast, engine)
+    df = store.read(file_path, columns, layout, engine)
+    return downcast_frame(df) if downcast else df
+
+
+def iter_frame_chunks(file_path, columns=None, layout=LAYOUT_DAR, store=dar_store, downcast=False, engine="c", chunk_rows=STATS_CHUNK_ROWS):
+    """与 load_frame 相同的列选择，按行分块读取（至少返回一块，文件没有数据行时为只有列名的空表）
+
+    Feather 文件与已写入列式存储的文件按记录批读取，csv（c 解析引擎）按 chunksize 读取，其余情况整表读取后再切分。
+    各块的列类型与整表读取时相同（csv 先按块扫描一遍确定各列类型）；downcast 时只压缩浮点列。
+    """
+    file_path = Path(file_path)
+    if file_path.suffix.lower() == '.feather':
+        header = read_header(file_path, layout)
+        selected = list(header) if columns is None else [column for column in dict.fromkeys(columns) if column in header]
+        chunks = _iter_feather(file_path, selected, chunk_rows)
+    elif store is not None:
+        chunks = store.iter_read(file_path, columns, layout, engine, chunk_rows)
+    elif file_path.suffix.lower() == '.csv' and engine == "c":
+        usecols = None
+        if columns is not None:
+            header = read_header(file_path, layout)
+            usecols = [column for column in dict.fromkeys(columns) if column in header]
+        dtypes = _csv_column_dtypes(file_path, usecols, layout, chunk_rows)
+        chunks = _csv_chunks(_csv_reader(file_path, usecols, layout, chunk_rows, dtypes), file_path, usecols, layout)
+    else:
+        chunks = _frame_slices(read_columns(file_path, columns, layout, engine=engine), chunk_rows)
+    for chunk in chunks:
+        yield downcast_frame(chunk, categorize=False) if downcast else chunk
+
+
+def _csv_reader(file_path, usecols, layout, chunk_rows, dtypes=None):
+    if layout == LAYOUT_DAR:
+        return pd.read_csv(file_path, skiprows=DAR_CSV_SKIPROWS, encoding=DAR_CSV_ENCODING, low_memory=False, usecols=usecols, chunksize=chunk_rows, dtype=dtypes)
+    return pd.read_csv(file_path, usecols=usecols, chunksize=chunk_rows, dtype=dtypes)
+
+
+def _merged_dtype(dtypes):
+    """各块推断的列类型合并为整表读取时的类型：整数与浮点合并为浮点，含文本或布尔与其他类型混合时为文本"""
+    dtypes = set(dtypes)
+    if len(dtypes) == 1:
+        return dtypes.pop()
+    if any(pd.api.types.is_bool_dtype(dtype) or not pd.api.types.is_numeric_dtype(dtype) for dtype in dtypes):
+        return str
+    return np.result_type(*dtypes)
+
+
+def _csv_column_dtypes(file_path, usecols, layout, chunk_rows):
+    """按块扫描 csv，返回与整表读取相同的各列类型（pandas 按块读取时各块单独推断类型，同一列在不同块中可能不同）"""
+    seen = {}
+    with _csv_reader(file_path, usecols, layout, chunk_rows) as reader:
+        for chunk in reader:
+            for column, dtype in chunk.dtypes.items():
+                seen.setdefault(column, set()).add(dtype)
+    return {column: _merged_dtype(dtypes) for column, dtypes in seen.items()}
+
+
+def _csv_chunks(reader, file_path, usecols, layout):
+    with reader:
+        yielded = False
+        for chunk in reader:
+            yielded = True
+            yield chunk[usecols] if usecols is not None else chunk
+    if not yielded:
+        yield read_columns(file_path, usecols, layout).iloc[:0]
+
+
+def resample_map(rows, target_rows):
+    """重新采样的索引与权重，所有列共用：新第 i 行在原第 lower[i] 与 upper[i] 行之间按 weight[i] 线性插值，nearest[i] 为最近的原行"""
+    positions = np.linspace(0, rows - 1, target_rows)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, rows - 1)
+    weight = positions - lower
+    nearest = np.rint(positions).astype(np.intp)
+    return lower, upper, weight, nearest
+
+
+def _column_blocks(file_path, store, engine, block_columns):
+    """按列分块读取 DAR 文件；已写入列式存储时每块只以内存映射方式读取这些列"""
+    if store is not None:
+        manifest = store.manifest(file_path, LAYOUT_DAR) or store.ingest(file_path, LAYOUT_DAR, engine)[0]
+        if manifest["stored"]:
+            columns = manifest["columns"]
+            for start in range(0, len(columns), block_columns):
+                yield store.read(file_path, columns[start:start + block_columns], LAYOUT_DAR, engine)
+            return
+    data = read_source(file_path, LAYOUT_DAR, engine)
+    for start in range(0, data.shape[1], block_columns):
+        yield data.iloc[:, start:start + block_columns]
+
+
+def normalize_file(input_file_path, target_rows, output_file_path, store=dar_store, engine="c", block_columns=NORMALIZE_BLOCK_COLUMNS):
+    """把 DAR 文件重新采样为 target_rows 行，写为 Feather 文件
+
+    数值列先前向、再后向填充缺失值，按共用的索引与权重线性插值；离散文本列按排序后的取值编码，取最近的原行（不插出小数编码）。
+    各列按 block_columns 分块处理，离散列在前、数值列在后，其他类型的列不输出。
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    if Path(input_file_path).suffix.lower() not in ('.csv', '.xlsx', '.xls'):
+        raise ValueError("Unsupported file format. Please use CSV or Excel files.")
+    resample = None
+    discrete, numeric = [], []
+    for block in _column_blocks(input_file_path, store, engine, block_columns):
+        if resample is None:
+            if block.empty:
+                raise ValueError("文件中没有数据行")
+            lower, upper, weight, nearest = resample = resample_map(len(block), target_rows)
+        for name, values in block.select_dtypes(include=['object', 'string']).items():
+            codes, _ = pd.factorize(values.ffill().bfill(), sort=True)
+            discrete.append((str(name), pa.array(codes[nearest])))
+        numeric_block = block.select_dtypes(include=['number'])
+        if numeric_block.shape[1]:
+            values = numeric_block.ffill().bfill().to_numpy(dtype=np.float64)
+            low = values[lower]
+            resampled = low + (values[upper] - low) * weight[:, None]
+            numeric.extend((str(name), pa.array(column)) for name, column in zip(numeric_block.columns, np.ascontiguousarray(resampled.T)))
+    if resample is None:
+        raise ValueError("文件中没有数据行")
+    names, arrays = zip(*(discrete + numeric)) if discrete or numeric else ((), ())
+    table = pa.Table.from_arrays(list(arrays), names=list(names))
+    suffix = f".{os.getpid()}.tmp"
+    feather.write_feather(table, f"{output_file_path}{suffix}", compression="uncompressed")
+    os.replace(f"{output_file_path}{suffix}", output_file_path)
+
+
+class QuantileDigest:
+    """可合并的分位数摘要（合并式 t-digest）：用有限个质心（均值, 权重）近似数据分布
+
+    质心按 k1 尺度函数划分，分布两端的质心更小，两端分位数更精确；内存只与 compression 有关。
+    """
+
+    def __init__(self, means=(), weights=(), compression=DIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.asarray(means, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+
+    @classmethod
+    def from_values(cls, values, compression=DIGEST_COMPRESSION):
+        values = np.asarray(values, dtype=np.float64)
+        return cls._compressed(values, np.ones(len(values)), compression)
+
+    @classmethod
+    def _compressed(cls, means, weights, compression):
+        if len(means) == 0:
+            return cls(compression=compression)
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        # 每个质心左边界的累积分位经 k1 尺度函数映射后取整，相同整数部分的点合并为一个质心
+        left_quantiles = (np.cumsum(weights) - weights) / weights.sum()
+        scale = compression / (2 * math.pi) * np.arcsin(2 * left_quantiles - 1)
+        groups = np.floor(scale - scale[0]).astype(np.int64)
+        groups = np.unique(groups, return_inverse=True)[1]
+        group_weights = np.bincount(groups, weights)
+        group_means = np.bincount(groups, weights * means) / group_weights
+        return cls(group_means, group_weights, compression)
+
+    def merge(self, other):
+        return self._compressed(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]), self.compression)
+
+    def quantile(self, q, minimum, maximum):
+        """第 q 分位数的近似值（0 <= q <= 1），两端以最小值、最大值为界"""
+        if not len(self.weights):
+            return np.nan
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * total, np.concatenate([[0], centers, [total]]), np.concatenate([[minimum], self.means, [maximum]])))
+
+
+class RunningStats:
+    """可合并的流式统计量：数量、平均值、M2（离差平方和）、最小值、最大值，可选分位数摘要
+
+    每块数据或每个文件单独计算后按 Chan 公式合并，合并结果与把全部数据放在一起计算相同（分位数为近似值），
+    任意多个文件的机队、机号或飞行阶段汇总只需常数内存。
+    """
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, minimum=np.inf, maximum=-np.inf, digest=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.minimum = minimum
+        self.maximum = maximum
+        self.digest = digest
+
+    @classmethod
+    def from_values(cls, values, digest=False):
+        """由一块数值计算统计量，空值忽略"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return cls(digest=QuantileDigest() if digest else None)
+        mean = values.mean()
+        return cls(len(values), float(mean), float(((values - mean) ** 2).sum()), float(values.min()), float(values.max()),
+                   QuantileDigest.from_values(values) if digest else None)
+
+    def update(self, values):
+        """累计一块数值（空值忽略），返回新的 RunningStats；创建时带分位数摘要的统计量继续累计摘要"""
+        return self.merge(RunningStats.from_values(values, self.digest is not None))
+
+    def merge(self, other):
+        """合并两组统计量（Chan 并行算法），返回新的 RunningStats"""
+        if not other.count:
+            return self
+        if not self.count:
+            return other
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        digest = self.digest.merge(other.digest) if self.digest is not None and other.digest is not None else None
+        return RunningStats(
+            count,
+            self.mean + delta * other.count / count,
+            self.m2 + other.m2 + delta * delta * self.count * other.count / count,
+            min(self.minimum, other.minimum),
+            max(self.maximum, other.maximum),
+            digest,
+        )
+
+    @property
+    def variance(self):
+        """样本方差（与 pandas 的 var 相同，数量少于 2 时为 NaN）"""
+        return self.m2 / (self.count - 1) if self.count > 1 else np.nan
+
+    def summary(self, quantiles=()):
+        """结果表中的一行统计值"""
+        row = {
+            "平均值": self.mean if self.count else np.nan,
+            "最大值": self.maximum if self.count else np.nan,
+            "最小值": self.minimum if self.count else np.nan,
+            "方差": self.variance,
+            "数量": self.count,
+        }
+        for q in quantiles:
+            row[f"P{q * 100:g}"] = self.digest.quantile(q, self.minimum, self.maximum) if self.digest is not None and self.count else np.nan
+        return row
+
+
+def parse_quantiles(text):
+    """解析逗号分隔的分位数（0~1 之间，如 "0.5,0.95"），格式不正确时抛出 ValueError"""
+    quantiles = tuple(float(item) for item in re.split(r'[,，\s]+', text.strip()) if item) if text else ()
+    if any(not 0 <= q <= 1 for q in quantiles):
+        raise ValueError("分位数需在 0 到 1 之间")
+    return quantiles
+
+
+def merge_stats(stats):
+    """按顺序合并多组 RunningStats"""
+    merged = RunningStats()
+    for item in stats:
+        merged = merged.merge(item)
+    return merged
+
+
+def convert_elements(elements, target_type):
+    """将限定参数元素转换为限定参数列的数据类型，返回列表；无法转换时抛出 ValueError"""
+    if isinstance(elements, list):
+        return [target_type(x) for x in elements]
+    return [target_type(elements)]
+
+
+def limited_param_file_stats(file_path, param_name, limited_param_name, limited_param_elements, store=dar_store, downcast=False, engine="c",
+                             group_param_name=None, digest=False):
+    """单个文件中限定参数等于给定元素的行上，查找参数的平均值、最大值、最小值与方差
+
+    返回 (统计结果, 错误信息, 可合并统计量)：没有符合条件的数据时统计结果为 None；错误信息为 None 表示处理成功。
+    可合并统计量为 {None: 整个文件的 RunningStats, 分组值: 该分组的 RunningStats}，按 group_param_name 列的取值分组（分组值见 group_key）。
+    文件按 STATS_CHUNK_ROWS 行分块读取（见 iter_frame_chunks），各块的统计量依次累计，文件的统计结果也由其得出。
+    """
+    file_path = Path(file_path)
+    try:
+        # 只读取限定参数列、查找参数列和分组参数列，按块筛选并累计，不同时载入整个文件
+        chunks = iter_frame_chunks(file_path, [limited_param_name, param_name, group_param_name], LAYOUT_DAR, store, downcast, engine)
+        data = next(chunks)
+
+        # 检查限定参数名称和查找参数名称对应的列是否存在
+        if limited_param_name not in data.columns:
+            return None, f"在文件 {file_path.name} 中未找到限定参数列 {limited_param_name}，请检查输入的限定参数名称是否正确，文件路径：{file_path}", {}
+        if param_name not in data.columns:
+            return None, f"在文件 {file_path.name} 中未找到查找参数名称列 {param_name}，请检查输入的查找参数名称是否正确，文件路径：{file_path}", {}
+        if group_param_name and group_param_name not in data.columns:
+            return None, f"在文件 {file_path.name} 中未找到分组参数列 {group_param_name}，请检查输入的分组参数名称是否正确，文件路径：{file_path}", {}
+
+        # 获取限定参数列的第一个元素的数据类型作为目标类型，转换限定参数元素的数据类型
+        target_type = type(data[limited_param_name].iloc[0])
+        try:
+            converted_elements = convert_elements([limited_param_elements], target_type)
+        except ValueError:
+            return None, f"无法将输入的限定参数元素转换为 {target_type.__name__} 类型，请检查输入的数据类型，文件路径：{file_path}，限定参数名称：{limited_param_name}", {}
+
+        accumulators = {None: RunningStats(digest=QuantileDigest() if digest else None)}
+        matched_rows = 0
+        for data in itertools.chain([data], chunks):
+            filtered_data = data[data[limited_param_name].isin(converted_elements)]
+            if filtered_data.empty:
+                continue
+            matched_rows += len(filtered_data)
+            values = pd.to_numeric(filtered_data[param_name], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+            accumulators[None] = accumulators[None].update(values)
+            if group_param_name:
+                groups = filtered_data[group_param_name].astype(object)
+                raw_values = {}
+                for raw in pd.unique(groups[groups.notna()]):
+                    raw_values.setdefault(group_key(raw), []).append(raw)
+                for group, raws in raw_values.items():
+                    rows = groups.isin(raws).to_numpy()
+                    accumulators[group] = accumulators.get(group, RunningStats(digest=QuantileDigest() if digest else None)).update(values[rows])
+        if not matched_rows:
+            return None, None, {}
+        summary = accumulators[None].summary()
+        return {
+            "文件名": file_path.name,
+            "平均值": summary["平均值"],
+            "最大值": summary["最大值"],
+            "最小值": summary["最小值"],
+            "方差": summary["方差"]
+        }, None, accumulators
+    except Exception as e:
+        print(f"处理文件 {file_path} 时出错: {e}")
+        return None, f"处理文件 {file_path} 时出现异常，请检查文件格式或数据内容是否正确，具体错误信息: {e}，文件路径：{file_path}", {}
+
+
+def group_key(value):
+    """分组值的统一表示：同一取值在不同块或文件中可能读为整数、浮点数或文本（如 0、0.0 与 "0"）"""
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _limited_param_task(args):
+    return limited_param_file_stats(*args)
+
+
+def tail_of(file_name, tail_pattern):
+    """按正则表达式从文件名中取机号（有分组时取第一个分组），不匹配时返回 None"""
+    match = re.search(tail_pattern, file_name)
+    if match is None:
+        return None
+    return match.group(1) if match.groups() else match.group(0)
+
+
+def calculate_limited_param_stats(input_folder_path, param_name, limited_param_name, limited_param_elements, store=dar_store, downcast=False, engine="c", workers=1,
+                                  group_param_name=None, tail_pattern=None, quantiles=()):
+    """文件夹中各文件的限定参数统计，返回 (统计结果列表, 错误信息列表)
+
+    统计结果先按文件名顺序列出各文件，再列出合并得到的汇总行：机队合计、各机号（tail_pattern 从文件名中取机号）、
+    各分组（group_param_name 列的取值，如飞行阶段）。汇总行由各文件的 RunningStats 合并，不需要同时载入各文件的数据；
+    quantiles 为需要的分位数（如 0.5, 0.95），各行增加对应的分位数列。
+    workers > 1 时各文件在进程池中独立读取与筛选，结果仍按文件名顺序合并；单个文件出错不影响其他文件。
+    """
+    files = list_data_files(input_folder_path)
+    digest = bool(quantiles)
+    tasks = [(file_path, param_name, limited_param_name, limited_param_elements, store, downcast, engine, group_param_name, digest) for file_path in files]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=multiprocessing.get_context(PROCESS_START_METHOD)) as executor:
+            outcomes = list(executor.map(_limited_param_task, tasks))
+    else:
+        outcomes = [_limited_param_task(task) for task in tasks]
+    errors = [error for _, error, _ in outcomes if error is not None]
+    matched = [(file_path, stats, accumulators) for file_path, (stats, _, accumulators) in zip(files, outcomes) if stats is not None]
+
+    results = []
+    for _, stats, accumulators in matched:
+        row = dict(stats)
+        row.update({key: value for key, value in accumulators[None].summary(quantiles).items() if key not in row})
+        results.append(row)
+    if not matched:
+        return results, errors
+
+    # 汇总行：按文件名顺序合并，合并顺序固定，结果可重复
+    results.append({"文件名": "机队合计", **merge_stats(accumulators[None] for _, _, accumulators in matched).summary(quantiles)})
+    if tail_pattern:
+        tails = {}
+        for file_path, _, accumulators in matched:
+            tail = tail_of(file_path.name, tail_pattern)
+            if tail is not None:
+                tails.setdefault(tail, []).append(accumulators[None])
+        for tail, items in sorted(tails.items()):
+            results.append({"文件名": f"机号 {tail}", **merge_stats(items).summary(quantiles)})
+    if group_param_name:
+        groups = {}
+        for _, _, accumulators in matched:
+            for group, item in accumulators.items():
+                if group is not None:
+                    groups.setdefault(group, []).append(item)
+        for group, items in sorted(groups.items(), key=lambda entry: str(entry[0])):
+            results.append({"文件名": f"{group_param_name} = {group}", **merge_stats(items).summary(quantiles)})
+    return results, errors
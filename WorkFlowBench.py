@@ -0,0 +1,239 @@
+import argparse
+import datetime
+import itertools
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from WorkFlowEngine import (ENGINE_MODEL_OPTIONS, ENGINE_SUBMODEL_OPTIONS, PLANE_MODEL_OPTIONS, PLANE_SUBMODEL_OPTIONS, SPR_CURVE_ITEMS,
+                            ModSbIndex, Profiler, compile_configuration_formula, compile_mpd_applicability, configuration_group_results,
+                            evaluate_configuration_frame, evaluate_maintenance_statement, evaluate_mpd_frame, to_excel, use_profiler)
+
+# WorkFlow 判断引擎的基准测试：按随机种子生成构型差异/MPD/MOD/SB/维修方案数据，
+# 记录各阶段耗时、每秒处理行数与峰值内存，结果保存为 JSON，便于不同版本之间比较
+# 示例：python WorkFlowBench.py --rows 1000 10000 200000 --mods 100 50000 --output bench.json
+#       python WorkFlowBench.py --rows 10000 --compare bench.json
+
+SELECTION = ("A320", "None", "CFM56-5", "CFM56-5B")
+REGISTRATION = "B-1234"
+MODEL_LINES = PLANE_MODEL_OPTIONS + PLANE_SUBMODEL_OPTIONS[:-1] + ENGINE_MODEL_OPTIONS + ENGINE_SUBMODEL_OPTIONS[:-1]
+
+
+def generate_mods(rng, count):
+    return [str(mod) for mod in rng.sample(range(10000, 100000), count)] if count <= 90000 else [f"{rng.randrange(10 ** 7):07d}" for _ in range(count)]
+
+
+def generate_sb_numbers(rng, count):
+    return [f"A320-{rng.randint(21, 80)}-{number:04d}" for number in rng.sample(range(10000), min(count, 10000))]
+
+
+def _mod_line(rng, mods):
+    # 约一半引用已装的MOD，其余为随机（未装）MOD号
+    mod = rng.choice(mods) if mods and rng.random() < 0.5 else str(rng.randrange(10000, 100000))
+    return f"{rng.choice(['POST', 'PRE'])} {mod}"
+
+
+def _sb_line(rng, sb_numbers):
+    sb_number = rng.choice(sb_numbers) if sb_numbers and rng.random() < 0.5 else f"A320-{rng.randint(21, 80)}-{rng.randrange(10000):04d}"
+    return f"({sb_number})"
+
+
+def _mod_block(rng, mods, sb_numbers):
+    """嵌套的 POST/PRE 块：一至三条MOD行，其后可带 "(SB)" 替代行与机型行"""
+    lines = [_mod_line(rng, mods) for _ in range(rng.randint(1, 3))]
+    if rng.random() < 0.4:
+        lines.append(_sb_line(rng, sb_numbers))
+    if rng.random() < 0.3:
+        lines.append(rng.choice(MODEL_LINES))
+    return lines
+
+
+def generate_configuration_formula(rng, mods, sb_numbers):
+    """构型差异公式：一至三个 POST/PRE 块，块之间以 OR 行分隔"""
+    blocks = [_mod_block(rng, mods, sb_numbers) for _ in range(rng.choices([1, 2, 3], [6, 3, 1])[0])]
+    return "\nOR\n".join("\n".join(block) for block in blocks)
+
+
+def generate_applicability(rng, mods, sb_numbers, group_items):
+    """MPD APPLICABILITY：ALL、GROUP ITEM 引用、机型行及 POST/PRE 块的组合"""
+    kind = rng.random()
+    if kind < 0.2:
+        return "ALL"
+    if kind < 0.4 and group_items:
+        lines = [rng.choice(group_items)]
+        if rng.random() < 0.3:
+            lines += ["OR", rng.choice(group_items)]
+        return "\n".join(lines)
+    if kind < 0.55:
+        return "\n".join(rng.sample(MODEL_LINES, rng.randint(1, 2)))
+    blocks = [_mod_block(rng, mods, sb_numbers) for _ in range(rng.choices([1, 2, 3], [6, 3, 1])[0])]
+    return "\nOR\n".join("\n".join(block) for block in blocks)
+
+
+def generate_dataset(seed, rows, mod_count, sb_count=None, config_rows=None, distinct=0.2):
+    """生成一组基准数据；distinct 为 MPD 中不同 APPLICABILITY 文本所占比例（实际文件中大量重复）"""
+    rng = random.Random(seed)
+    sb_count = sb_count if sb_count is not None else max(10, mod_count // 5)
+    config_rows = config_rows if config_rows is not None else max(10, rows // 20)
+    mods = generate_mods(rng, mod_count)
+    sb_numbers = generate_sb_numbers(rng, sb_count)
+
+    group_items = [f"GROUP-{i:04d}" for i in range(max(1, config_rows // 2))] + SPR_CURVE_ITEMS
+    config_df = pd.DataFrame({
+        "GROUP ITEM": [rng.choice(group_items) for _ in range(config_rows)],
+        "CONFIGURATION FORMULA": [generate_configuration_formula(rng, mods, sb_numbers) for _ in range(config_rows)],
+    })
+    pool = [generate_applicability(rng, mods, sb_numbers, group_items) for _ in range(max(1, int(rows * distinct)))]
+    task_numbers = [f"{rng.randint(5, 80):02d}-{i:06d}-01" for i in range(rows)]
+    mpd_df = pd.DataFrame({"TASK NUMBER": task_numbers, "APPLICABILITY": [rng.choice(pool) for _ in range(rows)]})
+    registrations = [REGISTRATION] + [f"B-{number}" for number in rng.sample(range(1000, 10000), 30)]
+    maintenance_tasks = rng.sample(task_numbers, rows // 2)
+    maintenance_df = pd.DataFrame({
+        "项目号": maintenance_tasks,
+        "飞机明细": [", ".join(rng.sample(registrations, rng.randint(1, 5))) if rng.random() < 0.9 else None for _ in maintenance_tasks],
+    })
+    return {
+        "config": config_df,
+        "mod": pd.DataFrame({"MOD": mods}),
+        "sb": pd.DataFrame({"SB号": sb_numbers}),
+        "mpd": mpd_df,
+        "maintenance": maintenance_df,
+    }
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），无法获取时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(seed, rows, mods, distinct=0.2, workers=1, export=False, profile=False):
+    """在当前进程中运行一组规模的基准测试，返回各阶段耗时与吞吐量（profile 时附带各次判断的统计）"""
+    profiler = use_profiler(Profiler(profile))
+    compile_configuration_formula.cache_clear()
+    compile_mpd_applicability.cache_clear()
+    stages = {}
+
+    def timed(stage, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        stages[stage] = round(time.perf_counter() - started, 4)
+        return result
+
+    data = timed("generate", generate_dataset, seed, rows, mods, None, None, distinct)
+    config_df, mpd_df = data["config"], data["mpd"]
+    mod_sb_index = timed("build_index", ModSbIndex.from_frames, data["mod"], data["sb"])
+    timed("compile", lambda: [compile_configuration_formula(text) for text in config_df["CONFIGURATION FORMULA"].unique()]
+          + [compile_mpd_applicability(text) for text in mpd_df["APPLICABILITY"].unique()])
+    config_df[["构型差异明细", "构型差异判断结果"]] = timed("configuration", evaluate_configuration_frame, config_df, SELECTION, mod_sb_index, None, workers)
+    group_results = timed("group_mapping", configuration_group_results, config_df, SELECTION, mod_sb_index)
+    mpd_df[["MPD判断明细", "MPD判断明细结果"]] = timed("mpd", evaluate_mpd_frame, mpd_df, SELECTION, mod_sb_index, group_results, None, workers)
+    result_df = timed("maintenance", evaluate_maintenance_statement, mpd_df, data["maintenance"], REGISTRATION)
+    if export:
+        timed("export", to_excel, result_df)
+
+    evaluation_time = sum(stages[stage] for stage in ["build_index", "compile", "configuration", "group_mapping", "mpd", "maintenance"])
+    return {
+        "seed": seed,
+        "rows": rows,
+        "mods": mods,
+        "config_rows": len(config_df),
+        "distinct_applicability": int(mpd_df["APPLICABILITY"].nunique()),
+        "workers": workers,
+        "stages": stages,
+        "rows_per_sec": {
+            "configuration": round(len(config_df) / stages["configuration"], 1) if stages["configuration"] else None,
+            "mpd": round(rows / stages["mpd"], 1) if stages["mpd"] else None,
+            "maintenance": round(rows / stages["maintenance"], 1) if stages["maintenance"] else None,
+            "total": round(rows / evaluation_time, 1) if evaluation_time else None,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "profile": profiler.report() if profile else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(previous, current):
+    """按 (rows, mods) 对比两次结果的总吞吐量，返回 [(rows, mods, 之前, 现在, 比值)]"""
+    previous_rates = {(scenario["rows"], scenario["mods"]): scenario["rows_per_sec"]["total"] for scenario in previous["scenarios"]}
+    comparison = []
+    for scenario in current["scenarios"]:
+        key = (scenario["rows"], scenario["mods"])
+        before, after = previous_rates.get(key), scenario["rows_per_sec"]["total"]
+        if before and after:
+            comparison.append((*key, before, after, round(after / before, 3)))
+    return comparison
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="WorkFlow 判断引擎基准测试")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000], help="MPD 行数（可给多个）")
+    parser.add_argument("--mods", type=int, nargs="+", default=[100, 5000, 50000], help="已装 MOD 数量（可给多个）")
+    parser.add_argument("--distinct", type=float, default=0.2, help="不同 APPLICABILITY 文本所占比例")
+    parser.add_argument("--seed", type=int, default=20240101)
+    parser.add_argument("--workers", type=int, default=1, help="并行进程数")
+    parser.add_argument("--export", action="store_true", help="同时测量结果导出为 xlsx 的耗时")
+    parser.add_argument("--profile", action="store_true", help="记录各次判断的耗时与计数（会增加少量开销）")
+    parser.add_argument("--output", default="workflow_bench.json", help="结果 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 比较总吞吐量")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.scenario:
+        # 子进程：只运行一组规模，结果以 JSON 输出到标准输出
+        print(json.dumps(run_scenario(**json.loads(args.scenario))))
+        return 0
+
+    # 每组规模在独立子进程中运行，峰值内存互不影响
+    scenarios = []
+    for rows, mods in itertools.product(args.rows, args.mods):
+        params = {"seed": args.seed, "rows": rows, "mods": mods, "distinct": args.distinct, "workers": args.workers, "export": args.export,
+                  "profile": args.profile}
+        completed = subprocess.run([sys.executable, __file__, "--scenario", json.dumps(params)], capture_output=True, text=True, check=True)
+        scenario = json.loads(completed.stdout.strip().splitlines()[-1])
+        scenarios.append(scenario)
+        print(f"rows={rows} mods={mods}: {scenario['rows_per_sec']['total']} 行/秒，峰值内存 {scenario['peak_rss_mb']} MB，阶段耗时 {scenario['stages']}")
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "scenarios": scenarios,
+    }
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"结果已保存到 {args.output}")
+
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        for rows, mods, before, after, ratio in compare_reports(previous, report):
+            print(f"rows={rows} mods={mods}: {before} -> {after} 行/秒（{ratio}x）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from WorkFlowEngine import (APPLICABILITY_STORE_PATH, ENGINE_MODEL_OPTIONS, ENGINE_SUBMODEL_OPTIONS, EXPORT_FORMATS, PLANE_MODEL_OPTIONS, PLANE_SUBMODEL_OPTIONS,
+                            ApplicabilityStore, ModSbIndex, Profiler, evaluate_new_aircraft, evaluation_cache, export_bytes, load_table, upload_cache, use_profiler)
+
+# 新飞机引进评估的命令行入口：不启动 Streamlit，读取文件、按给定构型评估并写出结果工作簿
+# 示例：python WorkFlowCLI.py --config 构型差异.xlsx --mod MOD.xlsx --sb SB.xlsx --mpd MPD.xlsx --maintenance 维修方案.xlsx \
+#           --plane-model A320 --plane-submodel None --engine-model CFM56-5 --engine-submodel CFM56-5B --registration B-1234
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="A320新飞机引进评估（命令行）")
+    parser.add_argument("--config", required=True, help="构型差异文件（xlsx/xls/csv）")
+    parser.add_argument("--mod", help="MOD 文件")
+    parser.add_argument("--sb", help="SB 文件")
+    parser.add_argument("--mpd", required=True, help="MPD 文件")
+    parser.add_argument("--maintenance", required=True, help="维修方案飞机明细文件")
+    for name in ["config", "mod", "sb", "mpd", "maintenance"]:
+        parser.add_argument(f"--{name}-sheet", help=f"{name} 文件的 Sheet 名称（默认第一个 Sheet）")
+    parser.add_argument("--plane-model", required=True, choices=PLANE_MODEL_OPTIONS, help="飞机型号")
+    parser.add_argument("--plane-submodel", required=True, choices=PLANE_SUBMODEL_OPTIONS, help="飞机子型号")
+    parser.add_argument("--engine-model", required=True, choices=ENGINE_MODEL_OPTIONS, help="发动机型号")
+    parser.add_argument("--engine-submodel", required=True, choices=ENGINE_SUBMODEL_OPTIONS, help="发动机子型号")
+    parser.add_argument("--registration", required=True, help="飞机注册号/MSN号")
+    parser.add_argument("--output-dir", default=".", help="结果工作簿的输出目录")
+    parser.add_argument("--format", default="xlsx", choices=list(EXPORT_FORMATS), help="结果文件格式")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="并行进程数")
+    parser.add_argument("--no-cache", action="store_true", help="不使用上传文件的列式缓存")
+    parser.add_argument("--store", default=str(APPLICABILITY_STORE_PATH), help="MPD判断结果库（SQLite）文件，与页面共用")
+    parser.add_argument("--no-store", action="store_true", help="不读取也不写入MPD判断结果库")
+    parser.add_argument("--profile", help="开启性能分析，并将各阶段耗时与计数写入此 JSON 文件")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    profiler = use_profiler(Profiler(bool(args.profile)))
+    cache = None if args.no_cache else upload_cache
+    store = None if args.no_store else ApplicabilityStore(args.store)
+    started = time.perf_counter()
+
+    tables = {}
+    for name in ["config", "mod", "sb", "mpd", "maintenance"]:
+        path = getattr(args, name)
+        tables[name] = load_table(path, getattr(args, f"{name}_sheet"), cache) if path else None
+    config_df, mpd_df, maintenance_df = tables["config"], tables["mpd"], tables["maintenance"]
+
+    # 检查所有必要的列是否存在
+    missing = [
+        f"{file_label}缺少'{column}'列"
+        for file_label, df, columns in [
+            ("构型差异文件", config_df, ["CONFIGURATION FORMULA"]),
+            ("MPD文件", mpd_df, ["APPLICABILITY", "TASK NUMBER"]),
+            ("维修方案飞机明细文件", maintenance_df, ["项目号", "飞机明细"]),
+        ]
+        for column in columns
+        if column not in df.columns
+    ]
+    if missing:
+        print("；".join(missing), file=sys.stderr)
+        return 2
+    loaded = time.perf_counter()
+
+    selection = (args.plane_model, args.plane_submodel, args.engine_model, args.engine_submodel)
+    mod_sb_index = ModSbIndex.from_frames(tables["mod"], tables["sb"])
+    config_result, maintenance_result = evaluate_new_aircraft(
+        config_df, mpd_df, maintenance_df, selection, args.registration, mod_sb_index, evaluation_cache, args.workers, store
+    )
+    evaluated = time.perf_counter()
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for file_stem, df in [("构型差异评估结果", config_result), ("维修方案评估结果", maintenance_result)]:
+        file_name = f"{file_stem}.{args.format}"
+        (output_dir / file_name).write_bytes(export_bytes(df, args.format, cache=None))
+        print(output_dir / file_name)
+    finished = time.perf_counter()
+
+    print(f"读取 {loaded - started:.2f}s，评估 {evaluated - loaded:.2f}s，写出 {finished - evaluated:.2f}s", file=sys.stderr)
+    if args.profile:
+        Path(args.profile).write_text(json.dumps(profiler.report(), ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2089 @@
+import contextvars
+import datetime
+import hashlib
+import itertools
+import multiprocessing
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 构型公式/APPLICABILITY 的编译与判断引擎（不依赖 Streamlit，可被 WorkFlow.py、WorkFlowCLI.py 及其他脚本导入）
+# pyarrow/openpyxl/xlsxwriter 只在读写文件时导入，保持导入本模块的开销与 pandas 相当
+
+ESTABLISHED = "成立"
+NOT_MET = "不符合"
+SB_SUBSTITUTE = "SB替代成立"
+MOD_SUBSTITUTE = "MOD替代成立"
+
+# 以这些前缀开头的行视为机型/发动机行，SB 匹配与 MOD 替代判断时直接跳过
+MODEL_PREFIXES = ("A", "LEAP", "PW", "IAE", "CFM", "V25")
+# 构型差异公式中 "None" 行的判断依据（沿用原判断逻辑中的列表）
+CONFIG_PLANE_MODELS = ["A318", "A319", "A20", "A321"]
+CONFIG_ENGINE_MODELS = ["CFM56-5", "IAE", "PW1100G", "LEAP-1A"]
+SPR_CURVE_ITEMS = ["PRE-SPR-CURVE", "POST-SPR-CURVE"]
+
+# 飞机/发动机选项（页面侧边栏与命令行共用）
+PLANE_MODEL_OPTIONS = ["A318", "A319", "A320", "A321"]
+PLANE_SUBMODEL_OPTIONS = ["A321-201", "None"]
+ENGINE_MODEL_OPTIONS = ["CFM56-5", "IAE", "PW1100G", "LEAP-1A"]
+ENGINE_SUBMODEL_OPTIONS = ["CFM56-5A", "CFM56-5B", "PW1100G-JM", "PW6122A", "PW6124A", "V2500-A1", "V2500-A5", "None"]
+
+CONFIG_APPLICABLE = "适用于此构型差异"
+CONFIG_NOT_APPLICABLE = "不适用于此构型差异"
+MPD_APPLICABLE = "适用于此项目"
+MPD_NOT_APPLICABLE = "不适用于此项目"
+
+MOD_LINE_PATTERN = re.compile(r'^(POST|PRE)\s+(.*)$')
+SB_NUMBER_PATTERN = re.compile(r'\((.*?)\)')
+LETTER_START_PATTERN = re.compile(r'^[A-Za-z]')
+
+# 机队构型表的列名（MOD/SB 列为每架飞机自己的清单，留空时使用上传的 MOD/SB 文件）
+FLEET_REGISTRATION = "飞机注册号/MSN号"
+FLEET_PLANE_MODEL = "飞机型号"
+FLEET_PLANE_SUBMODEL = "飞机子型号"
+FLEET_ENGINE_MODEL = "发动机型号"
+FLEET_ENGINE_SUBMODEL = "发动机子型号"
+FLEET_MOD = "MOD"
+FLEET_SB = "SB号"
+FLEET_REQUIRED_COLUMNS = [FLEET_REGISTRATION, FLEET_PLANE_MODEL, FLEET_PLANE_SUBMODEL, FLEET_ENGINE_MODEL, FLEET_ENGINE_SUBMODEL]
+FLEET_LIST_SEPARATOR = re.compile(r'[,，;；\n]')
+
+# 同一份 MPD/构型差异文件中相同的公式文本会重复成千上万次，编译结果按公式文本缓存
+FORMULA_CACHE_SIZE = 65536
+# 判断结果缓存的最大条目数（按最久未使用淘汰）
+EVALUATION_CACHE_SIZE = 100000
+# 待判断的不同公式少于此数量时顺序判断，避免进程池启动与传输开销
+PARALLEL_MIN_FORMULAS = 2000
+# 每个进程任务包含的公式条数
+PARALLEL_CHUNK_SIZE = 500
+# 进程池的启动方式：进程池在后台任务线程中创建，此时其他线程可能持有锁，fork 出的子进程可能因此死锁；
+# spawn 启动的进程不继承父进程的线程与锁，判断上下文由 _init_worker 传入
+PROCESS_START_METHOD = "spawn"
+# 上传文件解析结果的磁盘缓存目录与容量上限（超过时淘汰最久未使用的文件）
+UPLOAD_CACHE_DIR = Path(tempfile.gettempdir()) / "workflow_upload_cache"
+UPLOAD_CACHE_MAX_BYTES = 2 * 1024 ** 3
+# 判断逻辑的版本：随构型摘要写入结果库与增量评估的键，修改判断语义（如 OR/ALL 的识别方式）时必须加一，
+# 使按旧逻辑保存的结果不再被读取
+ENGINE_VERSION = 2
+# 持久数据（判断结果库）的目录：环境变量 WORKFLOW_DATA_DIR，否则为当前用户的缓存目录，不放在各用户共用的系统临时目录
+if os.environ.get("WORKFLOW_DATA_DIR"):
+    APP_DATA_DIR = Path(os.environ["WORKFLOW_DATA_DIR"])
+elif os.name == "nt":
+    APP_DATA_DIR = Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local") / "WorkFlow"
+else:
+    APP_DATA_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "workflow"
+# MPD判断结果库（SQLite）的位置，以及保留的 MPD 版本数（超过时删除最久未使用的版本）
+APPLICABILITY_STORE_PATH = APP_DATA_DIR / "applicability.sqlite"
+APPLICABILITY_STORE_MAX_REVISIONS = 3
+# MPD版本对比的变更类型；判断结果等评估生成的列不参与比较
+REVISION_ADDED = "新增"
+REVISION_REMOVED = "删除"
+REVISION_CHANGED = "变更"
+REVISION_IGNORED_COLUMNS = frozenset([
+    "TASK NUMBER", "MPD判断明细", "MPD判断明细结果", "飞机明细是否包含", "营运人是否有此条目", "主MP是否需要改版", "营运人MP是否需要改版", "MP判断结果",
+])
+# 保留的维修方案索引份数（按维修方案内容复用）
+MAINTENANCE_INDEX_CACHE_SIZE = 8
+# 后台评估任务的并行线程数与保留的已结束任务数（超过时删除最早结束的任务及其结果）
+JOB_MAX_WORKERS = 4
+JOB_HISTORY_SIZE = 20
+# 导出文件内容缓存的容量上限（字节）
+EXPORT_CACHE_MAX_BYTES = 512 * 1024 ** 2
+# 结果可导出的格式及对应的 MIME 类型
+EXPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+# 流式评估每次读取、判断并写出的行数
+STREAM_CHUNK_SIZE = 10000
+# pd.read_excel/pd.read_csv 默认视为缺失值的文本，流式读取时保持一致
+DEFAULT_NA_TEXTS = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+
+# 公式行的词法类型（每行只判定一次，各次判断按类型分派，不再对行文本重复做字符串判断）
+TOKEN_OR = "OR"                  # 独立成行的 OR 分隔符
+TOKEN_POST = "POST"              # 以 POST 开头的行
+TOKEN_PRE = "PRE"                # 以 PRE 开头的行
+TOKEN_SB_REF = "SB_REF"          # 以 "(" 开头的 SB 引用行
+TOKEN_ALL = "ALL"                # 含独立单词 ALL 的行
+TOKEN_MODEL = "MODEL"            # 以机型/发动机前缀开头的行
+TOKEN_GROUP_ITEM = "GROUP_ITEM"  # 其余行（GROUP ITEM 引用、"None" 等）
+
+# OR/ALL 只按完整单词匹配，避免 "FOR"、"INSTALL" 之类的文本被误判
+OR_WORD_PATTERN = re.compile(r'\bOR\b')
+ALL_WORD_PATTERN = re.compile(r'\bALL\b')
+
+# 公式行的词法分析结果
+#   type:         行类型（TOKEN_*）
+#   inline_or:    OR 分隔行以外的行中是否含有单词 OR
+#   has_all:      行中是否含有单词 ALL（MPD 第四次判断按此直接成立）
+#   model_prefix: 是否以 MODEL_PREFIXES 开头
+#   letter_start: 是否以字母开头
+#   mod:          POST/PRE 行解析出的 (POST|PRE, MOD号)，无法解析或含 OR 时为 None
+#   sb_number:    SB 引用行括号内的 SB 号，没有括号内容时为 None
+FormulaToken = namedtuple("FormulaToken", ["text", "type", "inline_or", "has_all", "model_prefix", "letter_start", "mod", "sb_number"])
+
+# 编译后的公式行（表达式树的叶子节点）
+#   type:        行类型（TOKEN_*，同 FormulaToken.type）
+#   mod:         MOD 条件 (POST|PRE, MOD号)，非 MOD 行为 None
+#   sb_number:   括号内的 SB 号，非 SB 行为 None
+#   sb_check:    第二次判断（SB 匹配）是否需要处理此行
+#   model_check: 第三次判断（机型匹配）是否需要处理此行
+FormulaTerm = namedtuple("FormulaTerm", ["text", "type", "mod", "sb_number", "sb_check", "model_check"])
+
+# 编译后的公式
+#   tokens:       按行排列的 FormulaToken
+#   terms:        按行排列的 FormulaTerm
+#   sb_anchors:   每行 SB 判断所依附的 POST/PRE 前缀，None 表示不做 SB 判断
+#                 （构型差异：该行文本首次出现之前最近的 POST/PRE 行；MPD：整段公式最后一个）
+#   or_groups:    OR 分隔行的行号，用于最终的 OR 分组判断
+#   sb_ref_lines: 参与 SB 替代判断的 SB 引用行的行号
+#   post_lines:   可能开启 MOD 替代的 POST 行的行号（两者为空时跳过对应的替代判断）
+CompiledFormula = namedtuple("CompiledFormula", ["lines", "tokens", "terms", "sb_anchors", "or_groups", "sb_ref_lines", "post_lines"])
+
+# 按词法类型一次遍历得到的行号信息
+#   preceding:   每一行之前最近的 POST/PRE 前缀
+#   last_prefix: 整段公式最后一个 POST/PRE 前缀
+TokenScan = namedtuple("TokenScan", ["preceding", "last_prefix", "or_groups", "sb_ref_lines", "post_lines"])
+
+
+@lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def tokenize_line(line):
+    """对一行公式做词法分析，两种公式共用；相同的行文本只分析一次"""
+    stripped = line.strip()
+    if stripped == "OR":
+        return FormulaToken(line, TOKEN_OR, False, False, False, False, None, None)
+    # 先做子串判断，绝大多数行不含 OR/ALL，无需执行正则
+    inline_or = "OR" in line and OR_WORD_PATTERN.search(line) is not None
+    has_all = "ALL" in stripped and ALL_WORD_PATTERN.search(stripped) is not None
+    model_prefix = line.startswith(MODEL_PREFIXES)
+    letter_start = LETTER_START_PATTERN.match(line) is not None
+    mod = sb_number = None
+    if line.startswith(("POST", "PRE")):
+        token_type = TOKEN_POST if line.startswith("POST") else TOKEN_PRE
+        match = None if inline_or else MOD_LINE_PATTERN.match(line)
+        if match:
+            mod = (match.group(1), match.group(2).replace(" ", "").strip())
+    elif line.startswith("("):
+        token_type = TOKEN_SB_REF
+        match = SB_NUMBER_PATTERN.search(line)
+        if match:
+            sb_number = match.group(1)
+    elif has_all:
+        token_type = TOKEN_ALL
+    elif model_prefix:
+        token_type = TOKEN_MODEL
+    else:
+        token_type = TOKEN_GROUP_ITEM
+    return FormulaToken(line, token_type, inline_or, has_all, model_prefix, letter_start, mod, sb_number)
+
+
+def _tokenize(text):
+    lines = text.strip().split('\n')
+    return lines, [tokenize_line(line) for line in lines]
+
+
+def _scan_tokens(tokens):
+    preceding = []
+    or_groups = []
+    sb_ref_lines = []
+    post_lines = []
+    current = None
+    for i, token in enumerate(tokens):
+        preceding.append(current)
+        if token.type == TOKEN_POST or token.type == TOKEN_PRE:
+            current = token.type
+            if token.type == TOKEN_POST and not token.inline_or:
+                post_lines.append(i)
+        elif token.type == TOKEN_OR:
+            or_groups.append(i)
+        elif token.type == TOKEN_SB_REF and not token.inline_or:
+            sb_ref_lines.append(i)
+    return TokenScan(preceding, current, tuple(or_groups), tuple(sb_ref_lines), tuple(post_lines))
+
+
+def _compiled(lines, tokens, terms, anchors, scan):
+    return CompiledFormula(
+        lines=tuple(lines),
+        tokens=tuple(tokens),
+        terms=tuple(terms),
+        sb_anchors=tuple(anchors),
+        or_groups=scan.or_groups,
+        sb_ref_lines=scan.sb_ref_lines,
+        post_lines=scan.post_lines,
+    )
+
+
+@lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def compile_configuration_formula(configuration_formula):
+    """将构型差异的 CONFIGURATION FORMULA 编译为 CompiledFormula，相同文本只编译一次"""
+    lines, tokens = _tokenize(configuration_formula)
+    scan = _scan_tokens(tokens)
+    first_index = {}
+    for i, line in enumerate(lines):
+        first_index.setdefault(line, i)
+    terms = []
+    anchors = []
+    prefix = mod_number = None
+    for line, token in zip(lines, tokens):
+        has_or = token.type == TOKEN_OR or token.inline_or
+        mod = None
+        if token.type in (TOKEN_POST, TOKEN_PRE):
+            if len(line.split()) < 2:
+                raise ValueError(f"无法解析构型公式中的MOD行: {line}")
+            if not has_or:
+                if token.mod is not None:
+                    prefix, mod_number = token.mod
+                elif prefix is None:
+                    raise ValueError(f"无法解析构型公式中的MOD行: {line}")
+                # 未能匹配的行沿用上一条MOD行的前缀与MOD号（与原判断逻辑一致）
+                mod = (prefix, mod_number)
+        sb_number = None
+        sb_check = not (has_or or token.model_prefix)
+        if sb_check and token.type == TOKEN_SB_REF:
+            sb_number = token.sb_number
+            sb_check = sb_number is not None
+        model_check = token.type not in (TOKEN_OR, TOKEN_POST, TOKEN_PRE, TOKEN_SB_REF)
+        terms.append(FormulaTerm(line, token.type, mod, sb_number, sb_check, model_check))
+        # MOD 行第一次判断后已带有判断结果，不再参与 SB 判断；其余行以该行文本首次出现的位置为准
+        anchors.append(scan.preceding[first_index[line]] if sb_check and mod is None else None)
+
+    return _compiled(lines, tokens, terms, anchors, scan)
+
+
+@lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def compile_mpd_applicability(applicability_text):
+    """将 MPD 的 APPLICABILITY 编译为 CompiledFormula，相同文本只编译一次"""
+    lines, tokens = _tokenize(applicability_text)
+    scan = _scan_tokens(tokens)
+    terms = []
+    anchors = []
+    for line, token in zip(lines, tokens):
+        has_or = token.type == TOKEN_OR or token.inline_or
+        sb_number = None
+        sb_check = not (has_or or token.letter_start)
+        if sb_check and token.type == TOKEN_SB_REF:
+            sb_number = token.sb_number
+            sb_check = sb_number is not None
+        # 机型匹配与 GROUP ITEM 判断按去除空格后的行文本分类
+        stripped = line.strip()
+        model_check = not (token.type == TOKEN_OR or stripped.startswith(("POST", "PRE", "(")))
+        terms.append(FormulaTerm(line, token.type, token.mod, sb_number, sb_check, model_check))
+        # MPD 的 SB 判断以整段公式中最后一个 POST/PRE 行为准
+        anchors.append(scan.last_prefix if sb_check else None)
+
+    return _compiled(lines, tokens, terms, anchors, scan)
+
+
+class StageClock:
+    """单条公式各次判断的分段计时，每次 lap 记录自上一次 lap 以来的耗时"""
+    __slots__ = ("profiler", "prefix", "last")
+
+    def __init__(self, profiler, prefix):
+        self.profiler = profiler
+        self.prefix = prefix
+        self.last = time.perf_counter()
+
+    def lap(self, stage, lines=0):
+        now = time.perf_counter()
+        self.profiler.add_time(f"{self.prefix}.{stage}", now - self.last, lines)
+        self.last = now
+
+
+class Profiler:
+    """判断过程的计时器与计数器，默认关闭
+
+    关闭时各判断函数只多一次属性检查；开启后按 "阶段名" 累计耗时、调用次数与处理行数，
+    并统计 MOD/SB 索引查找命中、判断结果缓存与上传缓存命中等计数。进程池中各进程的统计在返回时合并。
+    判断函数记入当前上下文的实例（见 use_profiler），每个页面会话、命令行运行与工作进程各自持有一个。
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.timings = defaultdict(lambda: [0.0, 0, 0])
+            self.counters = defaultdict(int)
+
+    def clock(self, prefix):
+        """开启时返回分段计时器，关闭时返回 None"""
+        return StageClock(self, prefix) if self.enabled else None
+
+    @contextmanager
+    def stage(self, name, lines=0):
+        """较粗粒度阶段（整表判断、读取、写出等）的计时上下文"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started, lines)
+
+    def add_time(self, name, seconds, lines=0):
+        with self._lock:
+            timing = self.timings[name]
+            timing[0] += seconds
+            timing[1] += 1
+            timing[2] += lines
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return {name: list(timing) for name, timing in self.timings.items()}, dict(self.counters)
+
+    def merge(self, snapshot):
+        """合并工作进程返回的统计"""
+        timings, counters = snapshot
+        with self._lock:
+            for name, (seconds, calls, lines) in timings.items():
+                timing = self.timings[name]
+                timing[0] += seconds
+                timing[1] += calls
+                timing[2] += lines
+            for name, amount in counters.items():
+                self.counters[name] += amount
+
+    def report(self):
+        """可序列化为 JSON 的统计结果"""
+        timings, counters = self.snapshot()
+        return {
+            "timings": {name: {"seconds": round(seconds, 6), "calls": calls, "lines": lines} for name, (seconds, calls, lines) in sorted(timings.items())},
+            "counters": dict(sorted(counters.items())),
+        }
+
+    def timing_frame(self):
+        return report_timing_frame(self.report())
+
+
+def report_timing_frame(report):
+    """Profiler.report() 结果中的各阶段耗时表"""
+    return pd.DataFrame(
+        [(name, timing["seconds"], timing["calls"], timing["lines"]) for name, timing in report["timings"].items()],
+        columns=["阶段", "耗时(秒)", "次数", "处理行数"],
+    )
+
+
+# 当前上下文（Streamlit 会话的脚本线程、后台任务、工作进程）使用的性能分析器；未设置时为始终关闭的实例
+_current_profiler = contextvars.ContextVar("workflow_profiler", default=Profiler())
+
+
+def current_profiler():
+    return _current_profiler.get()
+
+
+def use_profiler(profiler):
+    """之后在当前上下文中运行的判断记入 profiler；在此上下文中提交的后台任务沿用同一实例"""
+    _current_profiler.set(profiler)
+    return profiler
+
+
+class ModSbIndex:
+    """MOD/SB 查找索引，每次上传构建一次，供构型差异与MPD判断共用
+
+    SB 号按去除首尾空格后的文本做精确匹配（哈希集合）；
+    MOD 号沿用"包含于任一MOD"的匹配规则，通过三元组（n-gram）倒排索引筛选候选后再核对。
+    """
+    NGRAM_SIZE = 3
+
+    def __init__(self, mods=(), sb_numbers=()):
+        self.mods = [str(mod) for mod in mods]
+        self.sb_numbers = frozenset(str(sb_num).strip() for sb_num in sb_numbers)
+        # 短于 n-gram 长度的MOD号直接在拼接文本中查找，分隔符不会出现在MOD号中
+        self._joined_mods = "\x00".join(self.mods)
+        self._ngram_postings = {}
+        for mod_id, mod in enumerate(self.mods):
+            for gram in {mod[k:k + self.NGRAM_SIZE] for k in range(len(mod) - self.NGRAM_SIZE + 1)}:
+                self._ngram_postings.setdefault(gram, []).append(mod_id)
+        self._mod_results = {}
+        # MOD/SB 清单内容摘要，作为判断结果缓存键的一部分
+        digest = hashlib.sha1()
+        for mod in sorted(set(self.mods)):
+            digest.update(mod.encode("utf-8", "surrogatepass") + b"\x00")
+        digest.update(b"\x01")
+        for sb_num in sorted(self.sb_numbers):
+            digest.update(sb_num.encode("utf-8", "surrogatepass") + b"\x00")
+        self.digest = digest.hexdigest()
+
+    @classmethod
+    def from_frames(cls, mod_df, sb_df):
+        """由上传的 MOD 文件（MOD 列）与 SB 文件（SB号 列）构建索引，未上传的文件或缺少的列视为空"""
+        mods = mod_df["MOD"] if mod_df is not None and "MOD" in mod_df.columns else ()
+        sb_numbers = sb_df["SB号"] if sb_df is not None and "SB号" in sb_df.columns else ()
+        return cls(mods, sb_numbers)
+
+    def mod_found(self, mod_number):
+        """MOD号是否包含于任一MOD中"""
+        found = self._mod_results.get(mod_number)
+        if found is None:
+            found = self._mod_results[mod_number] = self._contains_mod(mod_number)
+        return found
+
+    def _contains_mod(self, mod_number):
+        if not mod_number:
+            return bool(self.mods)
+        if len(mod_number) < self.NGRAM_SIZE:
+            return mod_number in self._joined_mods
+        candidates = None
+        for k in range(len(mod_number) - self.NGRAM_SIZE + 1):
+            postings = self._ngram_postings.get(mod_number[k:k + self.NGRAM_SIZE])
+            if postings is None:
+                return False
+            if candidates is None or len(postings) < len(candidates):
+                candidates = postings
+        return any(mod_number in self.mods[mod_id] for mod_id in candidates)
+
+    def sb_found(self, sb_number):
+        """SB号是否与任一SB号完全一致"""
+        return sb_number in self.sb_numbers
+
+
+class EvaluationCache:
+    """判断结果的 LRU 缓存，键为 (判断类型, 公式文本, 构型摘要)
+
+    模块级实例在 Streamlit 重跑之间保留，三个评估按钮共用；超过容量时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, max_entries=EVALUATION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """命中时返回缓存结果并标记为最近使用，未命中返回 None"""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+evaluation_cache = EvaluationCache()
+
+
+class FrameCache:
+    """上传文件解析结果的列式磁盘缓存，键为文件内容与 Sheet 名称的摘要
+
+    首次解析后以未压缩的 Feather（Arrow IPC）格式保存，之后按内存映射方式读取，不再解析 xlsx；
+    缓存目录总大小超过 max_bytes 时按最近使用时间淘汰。无法转换为 Arrow 的表（如同列混合数字与文本）不缓存。
+    """
+
+    def __init__(self, directory=UPLOAD_CACHE_DIR, max_bytes=UPLOAD_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(data, sheet_name=None):
+        digest = hashlib.sha1(data)
+        digest.update(b"\x00" + repr(sheet_name).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return self.directory / f"{key}.feather"
+
+    def load(self, key):
+        """命中时返回缓存的 DataFrame 并刷新使用时间，未命中返回 None"""
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        path = self._path(key)
+        try:
+            table = feather.read_table(path, memory_map=True)
+            os.utime(path)
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        df = table.to_pandas()
+        # Arrow 的空值在文本列中还原为 None，改回 pd.read_excel 的 NaN
+        for column in df.columns[df.dtypes == object]:
+            df[column] = df[column].where(df[column].notna(), np.nan)
+        return df
+
+    def store(self, key, df):
+        """保存 DataFrame，返回是否成功写入（Arrow 会把非文本列名转为文本，此类表不缓存）"""
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        if not all(isinstance(column, str) for column in df.columns):
+            return False
+        path = self._path(key)
+        temp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            feather.write_feather(df, temp_path, compression="uncompressed")
+            os.replace(temp_path, path)
+        except (pa.ArrowException, ValueError, TypeError, OSError):
+            temp_path.unlink(missing_ok=True)
+            return False
+        self.evict()
+        return True
+
+    def evict(self):
+        """缓存目录超过容量上限时，从最久未使用的文件开始删除"""
+        with self._lock:
+            entries = []
+            for path in self.directory.glob("*.feather"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+    def get_or_parse(self, data, sheet_name, parse):
+        """按内容摘要读取缓存，未命中时调用 parse() 解析并写入缓存"""
+        key = self.key(data, sheet_name)
+        profiler = current_profiler()
+        with profiler.stage("upload.cache_load"):
+            df = self.load(key)
+        if df is None:
+            profiler.count("upload_cache.misses")
+            with profiler.stage("upload.parse"):
+                df = parse()
+            with profiler.stage("upload.cache_store"):
+                self.store(key, df)
+        else:
+            profiler.count("upload_cache.hits")
+        return df
+
+
+upload_cache = FrameCache()
+
+
+def configuration_digest(selection, mod_sb_index, group_digest=""):
+    """判断逻辑版本、飞机/发动机选择、MOD/SB 清单与 GROUP ITEM 判断结果的组合摘要"""
+    return hashlib.sha1(repr((ENGINE_VERSION, tuple(selection), mod_sb_index.digest, group_digest)).encode("utf-8")).hexdigest()
+
+
+def _group_digest(group_results):
+    """GROUP ITEM 判断结果映射的摘要，无引用时为空"""
+    return hashlib.sha1(repr(sorted(group_results.items(), key=repr)).encode("utf-8")).hexdigest() if group_results else ""
+
+
+def _judge(line, established):
+    return f"{line}{ESTABLISHED if established else NOT_MET}"
+
+
+def _apply_mod_terms(compiled, mod_found):
+    """第一次判断（MOD 匹配）：POST 需包含此MOD，PRE 需不包含此MOD"""
+    results = []
+    for term in compiled.terms:
+        if term.mod is None:
+            results.append(term.text)
+        else:
+            prefix, mod_number = term.mod
+            results.append(_judge(term.text, mod_found(mod_number) == (prefix == "POST")))
+    return results
+
+
+def _sb_established(term, anchor, sb_found):
+    sb_match_found = term.sb_number is not None and sb_found(term.sb_number)
+    return sb_match_found == (anchor == "POST")
+
+
+def _apply_sb_substitution(compiled, results):
+    """SB替代判断：成立的SB行使其紧邻的不符合POST行变为SB替代成立"""
+    tokens = compiled.tokens
+    for i in compiled.sb_ref_lines:
+        if ESTABLISHED not in results[i]:
+            continue
+        post_found = False
+        for j in range(i - 1, -1, -1):
+            reversed_line = results[j]
+            if tokens[j].type == TOKEN_POST:
+                post_found = True
+                if ESTABLISHED in reversed_line:
+                    break
+                elif NOT_MET in reversed_line:
+                    results[j] = reversed_line.replace(NOT_MET, SB_SUBSTITUTE)
+                    break
+            if not post_found:
+                break
+    return results
+
+
+def _apply_mod_substitution(compiled, results):
+    """MOD替代判断：成立的POST块内的SB行改为MOD替代成立，块内其他行不再输出"""
+    if not compiled.post_lines:
+        return results
+    substituted = []
+    processing_post_block = False
+    for token, line in zip(compiled.tokens, results):
+        if processing_post_block:
+            if token.type == TOKEN_SB_REF:
+                parentheses_content = line.strip(ESTABLISHED).strip(NOT_MET)
+                if parentheses_content:
+                    substituted.append(f"{parentheses_content} {MOD_SUBSTITUTE}")
+            elif token.type in (TOKEN_OR, TOKEN_PRE, TOKEN_POST):
+                substituted.append(line)
+                processing_post_block = False
+        else:
+            substituted.append(line)
+            if token.type == TOKEN_POST and not token.inline_or and ESTABLISHED in line:
+                processing_post_block = True
+    return substituted
+
+
+def _combine_results(compiled, results, applicable, not_applicable):
+    """按 OR 分组汇总各行判断，得出最终结论"""
+    def all_established(group):
+        return all(NOT_MET not in res for res in group if res != "OR")
+
+    or_lines_indices = compiled.or_groups
+    if not or_lines_indices:
+        established = all_established(results)
+    else:
+        established = (
+            all_established(results[:or_lines_indices[0]])
+            or all_established(results[or_lines_indices[-1] + 1:])
+            or any(all_established(results[start + 1:end]) for start, end in zip(or_lines_indices, or_lines_indices[1:]))
+        )
+    return "\n".join(results), applicable if established else not_applicable
+
+
+def _count_mod_lookups(compiled, results):
+    """性能分析开启时统计 MOD 索引查找次数与判断成立的行数（不计入各次判断耗时）"""
+    mod_lines = [i for i, term in enumerate(compiled.terms) if term.mod is not None]
+    profiler = current_profiler()
+    profiler.count("mod_index.lookups", len(mod_lines))
+    profiler.count("mod_index.established", sum(results[i].endswith(ESTABLISHED) for i in mod_lines))
+
+
+def _count_sb_lookups(compiled, sb_found):
+    """性能分析开启时统计 SB 索引查找次数与命中次数"""
+    sb_numbers = [term.sb_number for term in compiled.terms if term.sb_check and term.sb_number is not None]
+    profiler = current_profiler()
+    profiler.count("sb_index.lookups", len(sb_numbers))
+    profiler.count("sb_index.hits", sum(map(sb_found, sb_numbers)))
+
+
+def run_configuration_formula(compiled, plane_model, plane_submodel, engine_model, engine_submodel, mod_found, sb_found):
+    """按飞机构型遍历已编译的构型差异公式，返回 (构型差异明细, 构型差异判断结果)"""
+    clock = current_profiler().clock("CONFIGURATION")
+    # 第一次判断（MOD 匹配）
+    results = _apply_mod_terms(compiled, mod_found)
+    if clock is not None:
+        clock.lap("mod_match", len(compiled.terms))
+        _count_mod_lookups(compiled, results)
+        clock.last = time.perf_counter()
+
+    # 第二次判断（SB 匹配），依据原公式中该行之前最近的 POST/PRE 行
+    for i, term in enumerate(compiled.terms):
+        anchor = compiled.sb_anchors[i]
+        if anchor is not None:
+            results[i] = _judge(results[i], _sb_established(term, anchor, sb_found))
+    if clock is not None:
+        clock.lap("sb_match", len(compiled.terms))
+        _count_sb_lookups(compiled, sb_found)
+        clock.last = time.perf_counter()
+
+    # 第三次判断（机型匹配）
+    for i, term in enumerate(compiled.terms):
+        if not term.model_check:
+            continue
+        line = results[i]
+        plane_match = (plane_model in line) or (line == "None" and plane_model not in CONFIG_PLANE_MODELS)
+        plane_sub_match = (plane_submodel in line) or (line == "None" and plane_submodel == "None")
+        engine_match = (engine_model in line) or (line == "None" and engine_model not in CONFIG_ENGINE_MODELS)
+        engine_sub_match = (engine_submodel in line) or (line == "None" and engine_submodel == "None")
+        results[i] = _judge(line, plane_match or plane_sub_match or engine_match or engine_sub_match)
+    if clock is not None:
+        clock.lap("model_match", len(results))
+
+    # 第四次判断（SB 替代）与第五次判断（MOD 替代）
+    results = _apply_sb_substitution(compiled, results)
+    if clock is not None:
+        clock.lap("sb_substitute", len(results))
+    results = _apply_mod_substitution(compiled, results)
+    if clock is not None:
+        clock.lap("mod_substitute", len(results))
+    combined = _combine_results(compiled, results, CONFIG_APPLICABLE, CONFIG_NOT_APPLICABLE)
+    if clock is not None:
+        clock.lap("combine", len(results))
+    return combined
+
+
+def run_mpd_applicability(compiled, plane_model, plane_submodel, engine_model, engine_submodel, mod_found, sb_found, group_results):
+    """按飞机构型遍历已编译的 APPLICABILITY，返回 (MPD判断明细, MPD判断明细结果)
+
+    group_results 为 GROUP ITEM -> 构型差异判断结果 的映射（见 configuration_group_results）。
+    """
+    clock = current_profiler().clock("APPLICABILITY")
+    # 第一次判断（MOD 匹配）
+    results = _apply_mod_terms(compiled, mod_found)
+    if clock is not None:
+        clock.lap("mod_match", len(compiled.terms))
+        _count_mod_lookups(compiled, results)
+        clock.last = time.perf_counter()
+
+    # 第二次判断（SB 匹配）
+    for i, term in enumerate(compiled.terms):
+        anchor = compiled.sb_anchors[i]
+        if anchor is not None:
+            results[i] = _judge(results[i], _sb_established(term, anchor, sb_found))
+    if clock is not None:
+        clock.lap("sb_match", len(compiled.terms))
+        _count_sb_lookups(compiled, sb_found)
+        clock.last = time.perf_counter()
+
+    # 第三次判断（机型匹配，去除空格后完全一致）
+    selection = (plane_model, plane_submodel, engine_model, engine_submodel)
+    for i, term in enumerate(compiled.terms):
+        if term.model_check:
+            stripped_line = results[i].strip()
+            results[i] = _judge(results[i], bool(stripped_line) and stripped_line in selection)
+    if clock is not None:
+        clock.lap("model_match", len(results))
+
+    # 第四次判断（ALL 与 GROUP ITEM 引用）
+    for i, term in enumerate(compiled.terms):
+        stripped_line = results[i].strip()
+        if compiled.tokens[i].has_all:
+            results[i] = f"{stripped_line.strip(ESTABLISHED).strip(NOT_MET)}{ESTABLISHED}"
+        elif stripped_line in SPR_CURVE_ITEMS:
+            results[i] = _judge(stripped_line, group_results.get(stripped_line) == CONFIG_APPLICABLE)
+        elif not term.model_check:
+            continue
+        elif group_results.get(stripped_line) == CONFIG_APPLICABLE:
+            results[i] = f"{stripped_line}{ESTABLISHED}"
+    if clock is not None:
+        clock.lap("group_item", len(results))
+
+    # 第五次判断（SB 替代）与第六次判断（MOD 替代）
+    results = _apply_sb_substitution(compiled, results)
+    if clock is not None:
+        clock.lap("sb_substitute", len(results))
+    results = _apply_mod_substitution(compiled, results)
+    if clock is not None:
+        clock.lap("mod_substitute", len(results))
+    combined = _combine_results(compiled, results, MPD_APPLICABLE, MPD_NOT_APPLICABLE)
+    if clock is not None:
+        clock.lap("combine", len(results))
+    return combined
+
+
+def _evaluate_text(kind, text, selection, mod_sb_index, group_results):
+    if kind == "CONFIGURATION":
+        return run_configuration_formula(compile_configuration_formula(text), *selection, mod_sb_index.mod_found, mod_sb_index.sb_found)
+    return run_mpd_applicability(compile_mpd_applicability(text), *selection, mod_sb_index.mod_found, mod_sb_index.sb_found, group_results)
+
+
+# 进程池工作进程的判断上下文，由 _init_worker 在每个进程启动时设置一次
+_worker_context = None
+
+
+def _init_worker(kind, selection, mod_sb_index, group_results, profile=False):
+    """工作进程初始化：MOD/SB 索引等判断上下文每个进程只传输一次"""
+    global _worker_context
+    _worker_context = (kind, selection, mod_sb_index, group_results)
+    # 每个工作进程使用自己的实例，只返回本进程的部分
+    use_profiler(Profiler(profile))
+
+
+def _evaluate_chunk(texts):
+    """判断一块公式，性能分析开启时一并返回本块的统计供主进程合并"""
+    kind, selection, mod_sb_index, group_results = _worker_context
+    results = [_evaluate_text(kind, text, selection, mod_sb_index, group_results) for text in texts]
+    profiler = current_profiler()
+    if not profiler.enabled:
+        return results, None
+    snapshot = profiler.snapshot()
+    profiler.reset()
+    return results, snapshot
+
+
+def evaluation_executor(kind, selection, mod_sb_index, group_results, workers):
+    """按判断上下文初始化的进程池；多次判断共用同一上下文时（如流式评估的各块）可复用，只启动一次进程"""
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context(PROCESS_START_METHOD),
+        initializer=_init_worker, initargs=(kind, selection, mod_sb_index, group_results, current_profiler().enabled),
+    )
+
+
+def _evaluate_unique(values, kind, selection, mod_sb_index, group_results, cache, workers, progress=None, executor=None):
+    """相同文本只判断一次，按输入顺序返回结果
+
+    提供 cache 时先复用 (判断类型, 文本, 构型摘要) 已有的结果；未命中的公式较多且 workers > 1 时
+    分块交给进程池判断，结果按原顺序拼回，与顺序判断完全一致。executor 为 evaluation_executor
+    以相同参数创建的进程池，提供时直接使用且不关闭，否则临时创建。
+    progress(已完成行数, 总行数) 在每判断完一块公式后调用。
+    """
+    digest = configuration_digest(selection, mod_sb_index, _group_digest(group_results))
+    profiler = current_profiler()
+    evaluated = {}
+    pending = []
+    with profiler.stage(f"{kind}.cache_lookup", len(values)):
+        for value in values.unique():
+            result = cache.get((kind, value, digest)) if cache is not None else None
+            if result is None:
+                pending.append(value)
+            else:
+                evaluated[value] = result
+    profiler.count(f"{kind}.rows", len(values))
+    profiler.count(f"{kind}.distinct_texts", len(evaluated) + len(pending))
+    if cache is not None:
+        profiler.count("evaluation_cache.hits", len(evaluated))
+        profiler.count("evaluation_cache.misses", len(pending))
+
+    chunks = [pending[start:start + PARALLEL_CHUNK_SIZE] for start in range(0, len(pending), PARALLEL_CHUNK_SIZE)]
+    report = _chunk_progress(values, pending, progress)
+    results = []
+    if workers > 1 and len(pending) >= PARALLEL_MIN_FORMULAS:
+        with profiler.stage(f"{kind}.evaluate_parallel", len(pending)):
+            pool = executor if executor is not None else evaluation_executor(kind, selection, mod_sb_index, group_results, workers)
+            try:
+                for chunk_results, snapshot in pool.map(_evaluate_chunk, chunks):
+                    results.extend(chunk_results)
+                    if snapshot is not None:
+                        profiler.merge(snapshot)
+                    report(len(results))
+            finally:
+                # 任务取消时不再等待尚未开始的块（map 的迭代器关闭时取消其余块，共用的进程池由创建者关闭）
+                if executor is None:
+                    pool.shutdown(cancel_futures=True)
+    else:
+        with profiler.stage(f"{kind}.evaluate", len(pending)):
+            for chunk in chunks:
+                results.extend(_evaluate_text(kind, value, selection, mod_sb_index, group_results) for value in chunk)
+                report(len(results))
+
+    for value, result in zip(pending, results):
+        evaluated[value] = result
+        if cache is not None:
+            cache.put((kind, value, digest), result)
+    return [evaluated[value] for value in values]
+
+
+def _chunk_progress(values, pending, progress):
+    """返回 report(已判断的公式数)：按各公式在 values 中出现的行数换算为已完成行数后调用 progress"""
+    if progress is None:
+        return lambda evaluated_count: None
+    pending_rows = values.value_counts(dropna=False).reindex(pd.Index(pending, dtype=object), fill_value=0).to_numpy()
+    cumulative_rows = np.concatenate([[0], np.cumsum(pending_rows)])
+    cached_rows = len(values) - int(cumulative_rows[-1])
+    progress(cached_rows, len(values))
+
+    def report(evaluated_count):
+        progress(cached_rows + int(cumulative_rows[evaluated_count]), len(values))
+    return report
+
+
+def _progress_step(progress, offset, total):
+    """把某一步骤内的进度换算为整个任务的进度，offset 为此步骤之前已完成的行数"""
+    if progress is None:
+        return None
+    return lambda done, step_total=None: progress(offset + done, total)
+
+
+def evaluate_configuration_frame(config_df, selection, mod_sb_index, cache=None, workers=1, progress=None):
+    """判断构型差异文件的全部公式，返回 [构型差异明细, 构型差异判断结果]"""
+    results = _evaluate_unique(config_df["CONFIGURATION FORMULA"], "CONFIGURATION", selection, mod_sb_index, {}, cache, workers, progress)
+    return pd.DataFrame(results, columns=["构型差异明细", "构型差异判断结果"], index=config_df.index)
+
+
+def evaluate_mpd_frame(mpd_df, selection, mod_sb_index, group_results, cache=None, workers=1, progress=None, executor=None):
+    """判断MPD文件的全部 APPLICABILITY，返回 [MPD判断明细, MPD判断明细结果]
+
+    group_results 为 GROUP ITEM -> 构型差异判断结果 的映射，其内容也计入缓存键。
+    """
+    texts = mpd_df["APPLICABILITY"].map(lambda text: text if isinstance(text, str) else str(text))
+    results = _evaluate_unique(texts, "APPLICABILITY", selection, mod_sb_index, group_results, cache, workers, progress, executor)
+    return pd.DataFrame(results, columns=["MPD判断明细", "MPD判断明细结果"], index=mpd_df.index)
+
+
+def group_item_results(group_items, results):
+    """GROUP ITEM -> 构型差异判断结果（同一 GROUP ITEM 取第一条记录）"""
+    mapping = {}
+    for item, result in zip(group_items, results):
+        mapping.setdefault(item, result)
+    return mapping
+
+
+def configuration_group_results(config_df, selection, mod_sb_index, cache=None, workers=1):
+    """构型差异评估后构建一次 GROUP ITEM -> 构型差异判断结果 映射，MPD判断时按键直接查找
+
+    构型差异文件已带有"构型差异判断结果"列时直接使用，否则先按当前构型判断。
+    """
+    if config_df is None or "GROUP ITEM" not in config_df.columns:
+        return {}
+    if "构型差异判断结果" in config_df.columns:
+        results = config_df["构型差异判断结果"]
+    elif "CONFIGURATION FORMULA" in config_df.columns:
+        results = evaluate_configuration_frame(config_df, selection, mod_sb_index, cache, workers)["构型差异判断结果"]
+    else:
+        return {}
+    return group_item_results(config_df["GROUP ITEM"], results)
+
+
+class FormulaReverseIndex:
+    """MOD号 / SB号 / GROUP ITEM -> 引用它们的公式文本
+
+    判断结果只通过这些引用依赖 MOD/SB 清单与构型差异结果；清单变更后只需重新判断引用了
+    变化项的公式。无法编译的公式每次都重新判断（与整表判断一样报错）。
+    """
+
+    def __init__(self, kind, texts):
+        compile_text = compile_configuration_formula if kind == "CONFIGURATION" else compile_mpd_applicability
+        self.kind = kind
+        self.texts = set()
+        self.by_mod = defaultdict(set)
+        self.by_sb = defaultdict(set)
+        self.by_line = defaultdict(set)
+        self.unparsed = set()
+        for text in texts:
+            if text in self.texts:
+                continue
+            self.texts.add(text)
+            try:
+                compiled = compile_text(text)
+            except ValueError:
+                self.unparsed.add(text)
+                continue
+            for term in compiled.terms:
+                if term.mod is not None:
+                    self.by_mod[term.mod[1]].add(text)
+                if term.sb_number is not None:
+                    self.by_sb[term.sb_number].add(text)
+                # GROUP ITEM 引用按去除空格后的整行文本查找
+                self.by_line[term.text.strip()].add(text)
+
+    def affected(self, old_index, new_index, old_group_results=None, new_group_results=None):
+        """MOD/SB 索引（及 GROUP ITEM 判断结果）由旧变新后，结果可能改变的公式文本"""
+        affected = set(self.unparsed)
+        # 只有包含于新增或删除的MOD中的MOD号，其查找结果才可能变化；先用变化部分的索引筛选候选
+        changed_mods = ModSbIndex(set(old_index.mods) ^ set(new_index.mods))
+        if changed_mods.mods:
+            for mod_number, texts in self.by_mod.items():
+                if changed_mods.mod_found(mod_number) and old_index.mod_found(mod_number) != new_index.mod_found(mod_number):
+                    affected.update(texts)
+        for sb_number in (old_index.sb_numbers ^ new_index.sb_numbers) & self.by_sb.keys():
+            affected.update(self.by_sb[sb_number])
+        old_group_results = old_group_results or {}
+        new_group_results = new_group_results or {}
+        for item in set(old_group_results) | set(new_group_results):
+            if old_group_results.get(item) != new_group_results.get(item):
+                # 查找 GROUP ITEM 时所用的行文本可能已带有前几次判断追加的"成立/不符合"，按前缀匹配原行
+                item = str(item)
+                for end in range(1, len(item) + 1):
+                    affected.update(self.by_line.get(item[:end], ()))
+        return affected
+
+
+# 一次整表判断的结果快照，下次 MOD/SB 清单或构型差异结果变化时据此增量判断
+#   results: 公式文本 -> 判断结果；reverse_index: 上述文本的 FormulaReverseIndex
+EvaluationSnapshot = namedtuple("EvaluationSnapshot", ["kind", "selection", "mod_sb_index", "group_results", "results", "reverse_index"])
+
+
+def evaluate_frame_incremental(df, kind, selection, mod_sb_index, group_results=None, snapshot=None, cache=None, workers=1, progress=None):
+    """整表判断的增量版本，返回 (结果 DataFrame, 新快照, 重新判断的公式数)
+
+    snapshot 为上次判断的快照且判断类型与飞机/发动机选择相同时，只重新判断引用了变化的 MOD/SB/GROUP ITEM
+    的公式以及新出现的公式，其余直接沿用快照中的结果；否则整表判断。结果与整表判断完全一致。
+    """
+    group_results = group_results or {}
+    if kind == "CONFIGURATION":
+        texts = df["CONFIGURATION FORMULA"]
+        columns = ["构型差异明细", "构型差异判断结果"]
+    else:
+        texts = df["APPLICABILITY"].map(lambda text: text if isinstance(text, str) else str(text))
+        columns = ["MPD判断明细", "MPD判断明细结果"]
+    distinct_texts = texts.unique()
+
+    reused = {}
+    if snapshot is not None and snapshot.kind == kind and snapshot.selection == tuple(selection):
+        affected = snapshot.reverse_index.affected(snapshot.mod_sb_index, mod_sb_index, snapshot.group_results, group_results)
+        reused = {text: result for text, result in snapshot.results.items() if text not in affected}
+    pending = pd.Series([text for text in distinct_texts if text not in reused], dtype=object)
+    if progress is not None and len(distinct_texts):
+        # 沿用的公式视为已完成，其余行按已判断的公式比例计入进度
+        pending_progress = progress
+
+        def progress(done, total):
+            reused_rows = len(texts) * (len(distinct_texts) - total) / len(distinct_texts)
+            pending_progress(int(reused_rows + (len(texts) - reused_rows) * done / max(total, 1)), len(texts))
+    evaluated = dict(zip(pending, _evaluate_unique(pending, kind, selection, mod_sb_index, group_results, cache, workers, progress)))
+    profiler = current_profiler()
+    profiler.count(f"{kind}.incremental_reused", len(distinct_texts) - len(pending))
+    profiler.count(f"{kind}.incremental_reevaluated", len(pending))
+
+    results = {text: reused[text] if text in reused else evaluated[text] for text in distinct_texts}
+    if cache is not None and reused:
+        # 沿用的结果同样写入当前构型摘要下的缓存，之后的重跑直接命中
+        digest = configuration_digest(selection, mod_sb_index, _group_digest(group_results))
+        for text in distinct_texts:
+            if text in reused:
+                cache.put((kind, text, digest), reused[text])
+
+    reverse_index = snapshot.reverse_index if snapshot is not None and set(distinct_texts) <= snapshot.reverse_index.texts else FormulaReverseIndex(kind, distinct_texts)
+    new_snapshot = EvaluationSnapshot(kind, tuple(selection), mod_sb_index, dict(group_results), results, reverse_index)
+    result_df = pd.DataFrame([results[text] for text in texts], columns=columns, index=df.index)
+    return result_df, new_snapshot, len(pending)
+
+
+def _text_values(series):
+    return [value if isinstance(value, str) else str(value) for value in series.to_numpy(dtype=object)]
+
+
+def mpd_revision(mpd_df):
+    """MPD 版本标识：TASK NUMBER 与 APPLICABILITY 内容的摘要，任一项目号或适用性文本变化即为新版本"""
+    digest = hashlib.sha1()
+    for column in ("TASK NUMBER", "APPLICABILITY"):
+        if column in mpd_df.columns:
+            digest.update(f"\x01{column}\x01".encode("utf-8"))
+            digest.update("\x00".join(_text_values(mpd_df[column])).encode("utf-8", "surrogatepass"))
+    return digest.hexdigest()
+
+
+def task_keys(mpd_df):
+    """每行 MPD 在结果库中的键：去除首尾空格的 TASK NUMBER，同一版本中重复的项目号按出现顺序加 #序号"""
+    if "TASK NUMBER" in mpd_df.columns:
+        tasks = np.array([task.strip() for task in _text_values(mpd_df["TASK NUMBER"])], dtype=object)
+    else:
+        tasks = np.array([str(position) for position in range(len(mpd_df))], dtype=object)
+    occurrences = pd.Series(tasks).groupby(tasks, sort=False).cumcount().to_numpy()
+    return np.array([task if occurrence == 0 else f"{task}#{occurrence}" for task, occurrence in zip(tasks, occurrences)], dtype=object)
+
+
+class ApplicabilityStore:
+    """MPD判断结果的持久化结果库（SQLite），键为 (MPD版本, 构型摘要, TASK NUMBER)
+
+    结果库跨会话、跨飞机共享：构型签名相同（机型/发动机、MOD/SB 清单与 GROUP ITEM 结果均相同）的飞机
+    直接读取已有结果。MPD 内容变化即为新版本；写入新版本时只保留最近使用的 max_revisions 个版本，
+    也可用 invalidate 使指定版本或全部结果失效。大量项目的判断明细相同，明细文本按版本去重后单独保存。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS applicability (
+            revision TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            task TEXT NOT NULL,
+            detail_id INTEGER,
+            result TEXT,
+            PRIMARY KEY (revision, digest, task)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS details (
+            id INTEGER PRIMARY KEY,
+            revision TEXT NOT NULL,
+            detail TEXT NOT NULL,
+            UNIQUE (revision, detail)
+        );
+        CREATE TABLE IF NOT EXISTS revisions (
+            revision TEXT PRIMARY KEY,
+            last_used REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path=APPLICABILITY_STORE_PATH, max_revisions=APPLICABILITY_STORE_MAX_REVISIONS):
+        self.path = Path(path)
+        self.max_revisions = max_revisions
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        """每次操作使用独立连接（Streamlit 的各次重跑可能在不同线程中执行），语句在同一事务中提交"""
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            if not self._initialized:
+                connection.executescript(self.SCHEMA)
+                self._initialized = True
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _touch(self, connection, revision):
+        connection.execute("INSERT OR REPLACE INTO revisions (revision, last_used) VALUES (?, ?)", (revision, time.time()))
+
+    def load(self, revision, digest):
+        """读取某一 MPD 版本、某一构型摘要下已保存的结果，返回 TASK 键 -> (MPD判断明细, MPD判断明细结果)"""
+        with self._lock, self._connect() as connection:
+            rows = connection.execute(
+                "SELECT task, detail_id, result FROM applicability WHERE revision = ? AND digest = ?", (revision, digest)
+            ).fetchall()
+            if not rows:
+                return {}
+            details = dict(connection.execute(
+                "SELECT id, detail FROM details WHERE id IN "
+                "(SELECT DISTINCT detail_id FROM applicability WHERE revision = ? AND digest = ?)", (revision, digest)
+            ))
+            self._touch(connection, revision)
+        return {task: (details.get(detail_id), result) for task, detail_id, result in rows}
+
+    def save(self, revision, digest, rows):
+        """保存 (TASK 键, MPD判断明细, MPD判断明细结果)，并删除超出保留数量的旧版本"""
+        rows = list(rows)
+        with self._lock, self._connect() as connection:
+            distinct_details = {detail for _, detail, _ in rows if detail is not None}
+            connection.executemany(
+                "INSERT OR IGNORE INTO details (revision, detail) VALUES (?, ?)", ((revision, detail) for detail in distinct_details)
+            )
+            detail_ids = {detail: detail_id for detail_id, detail in connection.execute("SELECT id, detail FROM details WHERE revision = ?", (revision,))}
+            connection.executemany(
+                "INSERT OR REPLACE INTO applicability (revision, digest, task, detail_id, result) VALUES (?, ?, ?, ?, ?)",
+                ((revision, digest, task, detail_ids.get(detail), result) for task, detail, result in rows),
+            )
+            self._touch(connection, revision)
+            stale = [row[0] for row in connection.execute(
+                "SELECT revision FROM revisions ORDER BY last_used DESC LIMIT -1 OFFSET ?", (self.max_revisions,)
+            )]
+            for stale_revision in stale:
+                self._delete(connection, stale_revision)
+
+    def _delete(self, connection, revision):
+        for table in ("applicability", "details", "revisions"):
+            connection.execute(f"DELETE FROM {table} WHERE revision = ?", (revision,))
+
+    def invalidate(self, revision=None):
+        """删除指定 MPD 版本的全部结果；revision 为 None 时清空结果库"""
+        with self._lock, self._connect() as connection:
+            if revision is None:
+                for table in ("applicability", "details", "revisions"):
+                    connection.execute(f"DELETE FROM {table}")
+            else:
+                self._delete(connection, revision)
+
+    def revisions(self):
+        """已保存的 MPD 版本，按最近使用时间排序"""
+        with self._lock, self._connect() as connection:
+            return [row[0] for row in connection.execute("SELECT revision FROM revisions ORDER BY last_used DESC")]
+
+
+applicability_store = ApplicabilityStore()
+
+
+def evaluate_mpd_frame_stored(mpd_df, selection, mod_sb_index, group_results, store, evaluate=None, cache=None, workers=1, progress=None):
+    """先从结果库读取MPD判断结果，库中没有的行再判断并写回结果库，返回与 evaluate_mpd_frame 相同的两列
+
+    evaluate(frame, progress) 用于判断库中没有的行（默认 evaluate_mpd_frame）；全部命中时不做任何判断。
+    """
+    if evaluate is None:
+        def evaluate(frame, progress=None):
+            return evaluate_mpd_frame(frame, selection, mod_sb_index, group_results, cache, workers, progress)
+    revision = mpd_revision(mpd_df)
+    digest = configuration_digest(selection, mod_sb_index, _group_digest(group_results))
+    keys = task_keys(mpd_df)
+    profiler = current_profiler()
+    with profiler.stage("store.load", len(mpd_df)):
+        stored = store.load(revision, digest)
+    found = np.fromiter((key in stored for key in keys), dtype=bool, count=len(keys))
+    profiler.count("applicability_store.hits", int(found.sum()))
+    profiler.count("applicability_store.misses", int((~found).sum()))
+
+    columns = ["MPD判断明细", "MPD判断明细结果"]
+    if found.all():
+        if progress is not None:
+            progress(len(mpd_df), len(mpd_df))
+        return pd.DataFrame([stored[key] for key in keys], columns=columns, index=mpd_df.index)
+    step_progress = _progress_step(progress, int(found.sum()), len(mpd_df))
+    if not found.any():
+        results = evaluate(mpd_df, step_progress)
+        missing_results = results
+    else:
+        missing_results = evaluate(mpd_df[~found], step_progress)
+        results = pd.DataFrame([stored.get(key, (None, None)) for key in keys], columns=columns, index=mpd_df.index)
+        for column in columns:
+            values = results[column].to_numpy(dtype=object)
+            values[~found] = missing_results[column].to_numpy(dtype=object)
+            results[column] = values
+    with profiler.stage("store.save", len(missing_results)):
+        store.save(revision, digest, zip(keys[~found], missing_results[columns[0]], missing_results[columns[1]]))
+    return results
+
+
+def _revision_texts(mpd_df, column):
+    """版本对比使用的列文本：空单元格与文件中没有的列为空文本，并去除首尾空格"""
+    if column not in mpd_df.columns:
+        return np.full(len(mpd_df), "", dtype=object)
+    values = mpd_df[column]
+    return np.array([value.strip() for value in _text_values(values.where(values.notna(), ""))], dtype=object)
+
+
+def revision_fingerprints(mpd_df, columns):
+    """MPD 各行的指纹：每个比较列一个 64 位哈希（行数 × 列数）"""
+    fingerprints = np.empty((len(mpd_df), len(columns)), dtype=np.uint64)
+    for position, column in enumerate(columns):
+        values = _revision_texts(mpd_df, column)
+        fingerprints[:, position] = pd.util.hash_pandas_object(pd.Series(values, dtype=object), index=False).to_numpy()
+    return fingerprints
+
+
+def diff_mpd_revisions(old_mpd_df, new_mpd_df):
+    """按 TASK NUMBER 对齐新旧两版 MPD，比较行指纹，返回新增、删除与内容变更的行
+
+    返回列：TASK NUMBER、变更类型、变更列（逗号分隔）、原行号、新行号（按位置，新增/删除的一侧为 -1）。
+    内容完全相同的行不在结果中；重复的项目号按出现顺序分别对齐（见 task_keys）。
+    """
+    for label, df in [("原版MPD", old_mpd_df), ("新版MPD", new_mpd_df)]:
+        if "TASK NUMBER" not in df.columns:
+            raise ValueError(f"{label}文件缺少'TASK NUMBER'列")
+    columns = [column for column in dict.fromkeys([*old_mpd_df.columns, *new_mpd_df.columns]) if column not in REVISION_IGNORED_COLUMNS]
+    profiler = current_profiler()
+    with profiler.stage("revision.fingerprint", len(old_mpd_df) + len(new_mpd_df)):
+        old_keys, new_keys = task_keys(old_mpd_df), task_keys(new_mpd_df)
+        old_fingerprints = revision_fingerprints(old_mpd_df, columns)
+        new_fingerprints = revision_fingerprints(new_mpd_df, columns)
+
+    old_positions = pd.Index(old_keys).get_indexer(new_keys)
+    matched = old_positions >= 0
+    new_matched = np.flatnonzero(matched)
+    old_matched = old_positions[matched]
+    column_changed = old_fingerprints[old_matched] != new_fingerprints[new_matched]
+    changed = column_changed.any(axis=1)
+    removed = np.setdiff1d(np.arange(len(old_keys)), old_matched)
+    added = np.flatnonzero(~matched)
+    column_names = np.array(columns, dtype=object)
+
+    # 按新版顺序列出新增与变更的行，删除的行按原版顺序排在最后
+    rows = [(position, REVISION_ADDED, "", -1) for position in added]
+    rows += [
+        (new_position, REVISION_CHANGED, ", ".join(column_names[flags]), old_position)
+        for new_position, old_position, flags in zip(new_matched[changed], old_matched[changed], column_changed[changed])
+    ]
+    rows.sort()
+    diff = pd.DataFrame(rows, columns=["新行号", "变更类型", "变更列", "原行号"])
+    diff["TASK NUMBER"] = new_keys[diff["新行号"].to_numpy(dtype=int)]
+    removed_diff = pd.DataFrame({"TASK NUMBER": old_keys[removed], "变更类型": REVISION_REMOVED, "变更列": "", "原行号": removed, "新行号": -1})
+    diff = pd.concat([diff, removed_diff], ignore_index=True) if len(removed) else diff
+    profiler.count("revision.unchanged", int((~changed).sum()))
+    return diff[["TASK NUMBER", "变更类型", "变更列", "原行号", "新行号"]].astype({"原行号": int, "新行号": int})
+
+
+def _revision_values(mpd_df, column, positions):
+    """按行号取版本对比的列文本，行号为 -1 时为空"""
+    values = np.full(len(positions), "", dtype=object)
+    present = positions >= 0
+    values[present] = _revision_texts(mpd_df, column)[positions[present]]
+    return values
+
+
+def compare_mpd_revisions(old_mpd_df, new_mpd_df, selection, mod_sb_index, group_results, cache=None, workers=1, progress=None):
+    """MPD版本对比报告：只列出新增、删除与变更的行，并只对这些行按当前构型判断新旧两版的适用性
+
+    原判断结果按原版 APPLICABILITY 判断，新判断结果按新版判断；只有间隔等其他列变化的行，
+    新旧 APPLICABILITY 相同，只判断一次。非 APPLICABILITY 列的变化以“列: 原值 -> 新值”列在变更内容中。
+    """
+    diff = diff_mpd_revisions(old_mpd_df, new_mpd_df)
+    old_positions = diff["原行号"].to_numpy()
+    new_positions = diff["新行号"].to_numpy()
+    old_texts = _revision_values(old_mpd_df, "APPLICABILITY", old_positions)
+    new_texts = _revision_values(new_mpd_df, "APPLICABILITY", new_positions)
+
+    # 新旧两版待判断的文本合并后只判断一次，相同文本（包括未变的 APPLICABILITY）不重复判断
+    old_rows, new_rows = np.flatnonzero(old_positions >= 0), np.flatnonzero(new_positions >= 0)
+    texts = pd.Series(np.concatenate([old_texts[old_rows], new_texts[new_rows]]), dtype=object)
+    results = _evaluate_unique(texts, "APPLICABILITY", selection, mod_sb_index, group_results, cache, workers, progress) if len(texts) else []
+    old_results = np.full(len(diff), "", dtype=object)
+    new_results = np.full(len(diff), "", dtype=object)
+    new_details = np.full(len(diff), "", dtype=object)
+    for row, (_, result) in zip(old_rows, results[:len(old_rows)]):
+        old_results[row] = result
+    for row, (detail, result) in zip(new_rows, results[len(old_rows):]):
+        new_results[row] = result
+        new_details[row] = detail
+
+    # 每个变化的列只取一次新旧值，再按行拼接变更内容
+    changed_columns = [columns.split(", ") if columns else [] for columns in diff["变更列"]]
+    changes = [[] for _ in range(len(diff))]
+    for column in dict.fromkeys(column for columns in changed_columns for column in columns):
+        if column == "APPLICABILITY":
+            continue
+        rows = np.array([row for row, columns in enumerate(changed_columns) if column in columns])
+        old_values = _revision_values(old_mpd_df, column, old_positions[rows])
+        new_values = _revision_values(new_mpd_df, column, new_positions[rows])
+        for row, old_value, new_value in zip(rows, old_values, new_values):
+            changes[row].append(f"{column}: {old_value} -> {new_value}")
+    changes = ["；".join(items) for items in changes]
+
+    report = pd.DataFrame({
+        "TASK NUMBER": diff["TASK NUMBER"],
+        "变更类型": diff["变更类型"],
+        "变更列": diff["变更列"],
+        "变更内容": changes,
+        "原APPLICABILITY": old_texts,
+        "新APPLICABILITY": new_texts,
+        "原判断结果": old_results,
+        "新判断结果": new_results,
+        "适用性是否变化": np.where(old_results != new_results, "是", "否"),
+        "新判断明细": new_details,
+    })
+    return report
+
+
+def _split_fleet_list(value):
+    """将机队构型表中逗号/分号/换行分隔的 MOD 或 SB 清单拆分为元组，空单元格返回 None"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    items = tuple(sorted({item.strip() for item in FLEET_LIST_SEPARATOR.split(str(value)) if item.strip()}))
+    return items or None
+
+
+def fleet_signature(row):
+    """机队构型表一行对应的构型签名：机型/发动机选择 + 该机 MOD/SB 清单（None 表示沿用上传文件）"""
+    selection = tuple(str(row[column]).strip() for column in FLEET_REQUIRED_COLUMNS[1:])
+    return selection, _split_fleet_list(row.get(FLEET_MOD)), _split_fleet_list(row.get(FLEET_SB))
+
+
+def duplicate_registrations(fleet_df):
+    """机队构型表中出现不止一次的飞机注册号/MSN号（去除首尾空格后比较），按首次出现的顺序返回"""
+    registrations = fleet_df[FLEET_REGISTRATION].astype(object).map(str).str.strip()
+    return registrations[registrations.duplicated()].unique().tolist()
+
+
+def evaluate_fleet(fleet_df, config_df, mpd_df, mod_sb_index, cache=None, workers=1, store=None, progress=None):
+    """机队批量评估：相同构型签名的飞机只判断一次，再将结果展开到各架飞机
+
+    提供 store（ApplicabilityStore）时，已在结果库中的构型签名直接读取结果。
+    progress 按 构型签名数 × MPD行数 报告进度。返回 (长表结果, 项目×飞机适用性矩阵)。
+    飞机注册号/MSN号重复时矩阵的列无法区分，抛出 ValueError。
+    """
+    duplicates = duplicate_registrations(fleet_df)
+    if duplicates:
+        raise ValueError(f"机队构型文件中的飞机注册号/MSN号重复：{'、'.join(duplicates)}")
+    signatures = {}
+    registrations = []
+    for _, row in fleet_df.iterrows():
+        registration = str(row[FLEET_REGISTRATION]).strip()
+        signature = fleet_signature(row)
+        signatures.setdefault(signature, []).append(registration)
+        registrations.append((registration, signature))
+
+    task_numbers = mpd_df["TASK NUMBER"] if "TASK NUMBER" in mpd_df.columns else pd.Series(range(len(mpd_df)), index=mpd_df.index)
+    evaluated = {}
+    for signature_id, signature in enumerate(signatures):
+        selection, mods, sb_numbers = signature
+        if mods is None and sb_numbers is None:
+            index = mod_sb_index
+        else:
+            index = ModSbIndex(
+                mods if mods is not None else mod_sb_index.mods,
+                sb_numbers if sb_numbers is not None else mod_sb_index.sb_numbers,
+            )
+        # 每个构型签名按自己的构型差异结果解析 GROUP ITEM 引用
+        config_frame = config_df.drop(columns="构型差异判断结果", errors="ignore") if config_df is not None else None
+        group_results = configuration_group_results(config_frame, selection, index, cache, workers)
+        step_progress = _progress_step(progress, signature_id * len(mpd_df), len(signatures) * len(mpd_df))
+        if store is not None:
+            mpd_results = evaluate_mpd_frame_stored(mpd_df, selection, index, group_results, store, cache=cache, workers=workers, progress=step_progress)
+        else:
+            mpd_results = evaluate_mpd_frame(mpd_df, selection, index, group_results, cache, workers, step_progress)
+        evaluated[signature] = (signature_id, mpd_results)
+
+    long_frames = []
+    matrix = pd.DataFrame({"TASK NUMBER": task_numbers.to_numpy()})
+    for registration, signature in registrations:
+        signature_id, mpd_results = evaluated[signature]
+        long_frames.append(pd.DataFrame({
+            FLEET_REGISTRATION: registration,
+            "构型签名": signature_id,
+            "TASK NUMBER": task_numbers.to_numpy(),
+            "MPD判断明细": mpd_results["MPD判断明细"].to_numpy(),
+            "MPD判断明细结果": mpd_results["MPD判断明细结果"].to_numpy(),
+        }))
+        matrix[registration] = (mpd_results["MPD判断明细结果"] == MPD_APPLICABLE).map({True: "是", False: "否"}).to_numpy()
+
+    columns = [FLEET_REGISTRATION, "构型签名", "TASK NUMBER", "MPD判断明细", "MPD判断明细结果"]
+    long_df = pd.concat(long_frames, ignore_index=True) if long_frames else pd.DataFrame(columns=columns)
+    return long_df, matrix
+
+
+# 第七次判断逻辑（MP判断结果决策表）
+MP_DECISIONS = [
+    "此项目不适用于此架飞机，现行MP无此项目，飞机明细不包含此架飞机，需要新增",
+    "此项目适用于此架飞机，现行MP有此项目，飞机明细包含此架飞机，无需改版",
+    "此项目适用于此架飞机，现行MP有此项目，飞机明细不包含此架飞机，需要改版-手动复核飞机明细",
+    "此项目不适用于此架飞机，现行MP有此项目，飞机明细包含此架飞机，需要改版",
+    "此项目不适用于此架飞机，现行MP无此项目，飞机明细不包含此架飞机，无需改版",
+]
+
+
+class MaintenanceIndex:
+    """维修方案索引：飞机注册号/MSN号 -> 飞机明细中列出此飞机的项目号集合（倒排索引）
+
+    每份维修方案只拆分一次飞机明细，各项目、各架飞机的判断共用；每个项目号取第一条记录的飞机明细。
+    """
+
+    def __init__(self, maintenance_df):
+        maintenance = pd.DataFrame({
+            # 空表（只有表头）读入的列为 float64，先转为 object，保证 .str 可用
+            "项目号": maintenance_df['项目号'].astype(object).map(str).str.strip(),
+            "飞机明细": maintenance_df['飞机明细'],
+        }).reset_index(drop=True)
+        maintenance["营运人是否有此条目"] = maintenance["飞机明细"].notna()
+        projects = maintenance.drop_duplicates("项目号").drop(columns="营运人是否有此条目")
+        projects["营运人是否有此条目"] = maintenance.groupby("项目号", sort=False)["营运人是否有此条目"].any().to_numpy()
+        self._projects = projects[["项目号", "营运人是否有此条目"]].reset_index(drop=True)
+        self._project_numbers = self._projects["项目号"].to_numpy(dtype=object)
+
+        # 展开飞机明细列表，按注册号汇总列出此飞机的项目号
+        plane_details = projects["飞机明细"].astype(object).map(str).str.split(',').explode().str.strip()
+        listed = pd.DataFrame({"飞机": plane_details.to_numpy(), "项目号": projects.loc[plane_details.index, "项目号"].to_numpy()})
+        self._registration_tasks = {registration: frozenset(tasks) for registration, tasks in listed.groupby("飞机", sort=False)["项目号"]}
+
+    def tasks_for(self, plane_registration):
+        """飞机明细中列出此飞机的全部项目号"""
+        return self._registration_tasks.get(plane_registration.strip(), frozenset())
+
+    def has_task(self, plane_registration, task_number):
+        """项目号的飞机明细是否包含此飞机"""
+        return str(task_number).strip() in self.tasks_for(plane_registration)
+
+    def projects(self, plane_registration):
+        """此飞机的维修方案汇总：[项目号, 项目匹配, 营运人是否有此条目, 飞机明细是否包含]"""
+        projects = self._projects.copy()
+        tasks = self.tasks_for(plane_registration)
+        projects["飞机明细是否包含"] = np.fromiter((task in tasks for task in self._project_numbers), dtype=bool, count=len(self._project_numbers))
+        projects["项目匹配"] = True
+        return projects[["项目号", "项目匹配", "营运人是否有此条目", "飞机明细是否包含"]]
+
+
+_maintenance_indexes = OrderedDict()
+_maintenance_indexes_lock = threading.Lock()
+
+
+def maintenance_index(maintenance_df):
+    """按维修方案内容复用 MaintenanceIndex：同一会话中重跑、各按钮与各架飞机只构建一次"""
+    key = frame_digest(maintenance_df[['项目号', '飞机明细']])
+    if key is None:
+        return MaintenanceIndex(maintenance_df)
+    with _maintenance_indexes_lock:
+        index = _maintenance_indexes.get(key)
+        if index is not None:
+            _maintenance_indexes.move_to_end(key)
+            return index
+    index = MaintenanceIndex(maintenance_df)
+    with _maintenance_indexes_lock:
+        _maintenance_indexes[key] = index
+        while len(_maintenance_indexes) > MAINTENANCE_INDEX_CACHE_SIZE:
+            _maintenance_indexes.popitem(last=False)
+    return index
+
+
+def summarize_maintenance_projects(maintenance_df, plane_registration):
+    """按项目号汇总维修方案，返回 [项目号, 项目匹配, 营运人是否有此条目, 飞机明细是否包含]"""
+    return maintenance_index(maintenance_df).projects(plane_registration)
+
+
+def apply_maintenance_projects(mpd_df, projects):
+    """按 TASK NUMBER 左连接维修方案汇总，写入MP判断结果及相关状态列（原地更新并返回 mpd_df）"""
+    task_numbers = mpd_df['TASK NUMBER']
+    task_numbers = task_numbers.where(task_numbers.notna(), "").map(str).str.strip()
+    matched = pd.DataFrame({"项目号": task_numbers.to_numpy()}).merge(projects, on="项目号", how="left")
+    project_match = matched["项目匹配"].notna().to_numpy()
+    operator_has_project = matched["营运人是否有此条目"].eq(True).to_numpy()
+    plane_included = matched["飞机明细是否包含"].eq(True).to_numpy()
+
+    applicable = (mpd_df['MPD判断明细结果'] == MPD_APPLICABLE).to_numpy()
+    not_applicable = (mpd_df['MPD判断明细结果'] == MPD_NOT_APPLICABLE).to_numpy()
+    operator_project = project_match & operator_has_project
+    mp_result = np.select(
+        [
+            ~project_match & not_applicable,
+            operator_project & applicable & plane_included,
+            operator_project & applicable & ~plane_included,
+            operator_project & ~applicable & plane_included,
+            operator_project & ~applicable & ~plane_included,
+        ],
+        MP_DECISIONS,
+        default="",
+    )
+    needs_revision = np.char.find(mp_result.astype(str), "需要改版") >= 0
+
+    # 更新相关状态列
+    mpd_df['飞机明细是否包含'] = np.where(plane_included, "是", "否")
+    mpd_df['营运人是否有此条目'] = np.where(operator_has_project, "是", "否")
+    mpd_df['主MP是否需要改版'] = np.where(needs_revision, "是", "否")
+    mpd_df['营运人MP是否需要改版'] = np.where(needs_revision, "是", "否")
+    mpd_df['MP判断结果'] = mp_result
+    return mpd_df
+
+
+def evaluate_maintenance_statement(mpd_df, maintenance_df, plane_registration):
+    with current_profiler().stage("maintenance", len(mpd_df)):
+        return apply_maintenance_projects(mpd_df, summarize_maintenance_projects(maintenance_df, plane_registration))
+
+
+# 合并后的评估函数：MPD判断后进行维修方案评估
+def evaluate_all(mpd_df, maintenance_df, plane_registration, selection, mod_sb_index, group_results, cache=None, workers=1, store=None, progress=None):
+    if store is not None:
+        mpd_results = evaluate_mpd_frame_stored(mpd_df, selection, mod_sb_index, group_results, store, cache=cache, workers=workers, progress=progress)
+    else:
+        mpd_results = evaluate_mpd_frame(mpd_df, selection, mod_sb_index, group_results, cache, workers, progress)
+    mpd_df[["MPD判断明细", "MPD判断明细结果"]] = mpd_results
+    return evaluate_maintenance_statement(mpd_df, maintenance_df, plane_registration)
+
+
+def evaluate_new_aircraft(config_df, mpd_df, maintenance_df, selection, plane_registration, mod_sb_index, cache=None, workers=1, store=None, progress=None):
+    """新飞机引进评估：构型差异评估 -> MPD判断（GROUP ITEM 引用构型差异结果）-> 维修方案评估
+
+    返回 (构型差异评估结果, 维修方案评估结果)，config_df 与 mpd_df 原地加入结果列；
+    提供 store 时MPD判断结果先从结果库读取。progress 按 构型差异行数 + MPD行数 报告进度。
+    """
+    total_rows = len(config_df) + len(mpd_df)
+    config_df[["构型差异明细", "构型差异判断结果"]] = evaluate_configuration_frame(
+        config_df, selection, mod_sb_index, cache, workers, _progress_step(progress, 0, total_rows)
+    )
+    group_results = configuration_group_results(config_df, selection, mod_sb_index, cache, workers)
+    result_df = evaluate_all(
+        mpd_df, maintenance_df, plane_registration, selection, mod_sb_index, group_results, cache, workers, store,
+        _progress_step(progress, len(config_df), total_rows),
+    )
+    return config_df[["构型差异明细", "构型差异判断结果"]], result_df
+
+
+class ExportCache:
+    """导出文件内容的 LRU 缓存，键为 (导出格式, 结果摘要)，按总字节数淘汰
+
+    下载按钮每次重跑都会重新生成文件内容，结果未变时直接返回已导出的字节。
+    """
+
+    def __init__(self, max_bytes=EXPORT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            if len(data) > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous)
+            self._entries[key] = data
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+export_cache = ExportCache()
+
+
+def frame_digest(df):
+    """DataFrame 列名与内容的摘要（不含索引），无法计算时返回 None"""
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    except TypeError:
+        return None
+    digest = hashlib.sha1(repr(list(df.columns)).encode("utf-8"))
+    digest.update(row_hashes.tobytes())
+    return digest.hexdigest()
+
+
+def _serialize(df, file_format):
+    output = BytesIO()
+    if file_format == "xlsx":
+        # constant_memory 模式逐行写出，导出时内存占用不随行数增长
+        with ChunkedResultWriter(output) as writer:
+            writer.write(df)
+    elif file_format == "csv":
+        output.write(df.to_csv(index=False).encode("utf-8-sig"))
+    elif file_format == "parquet":
+        import pyarrow as pa
+
+        frame = df.rename(columns=str)
+        try:
+            frame.to_parquet(output, index=False)
+        except (pa.ArrowException, ValueError, TypeError):
+            # 同一列混合数字与文本时按文本保存（空值保持为空）
+            output = BytesIO()
+            frame = frame.apply(lambda column: column.where(column.isna(), column.astype(str)) if column.dtype == object else column)
+            frame.to_parquet(output, index=False)
+    else:
+        raise ValueError(f"不支持的导出格式：{file_format}")
+    return output.getvalue()
+
+
+def export_bytes(df, file_format="xlsx", cache=export_cache):
+    """将结果导出为 xlsx/csv/parquet 文件内容，相同内容与格式只序列化一次"""
+    digest = frame_digest(df) if cache is not None else None
+    profiler = current_profiler()
+    if digest is not None:
+        data = cache.get((file_format, digest))
+        if data is not None:
+            profiler.count("export_cache.hits")
+            return data
+        profiler.count("export_cache.misses")
+    with profiler.stage(f"export.{file_format}", len(df)):
+        data = _serialize(df, file_format)
+    if digest is not None:
+        cache.put((file_format, digest), data)
+    return data
+
+
+def to_excel(df):
+    return export_bytes(df, "xlsx")
+
+
+def frame_summary(df):
+    """各列的类型、非空数与空值数（上传文件预览只发送此摘要与当前页，不发送整张表）"""
+    non_null = df.notna().sum().to_numpy()
+    return pd.DataFrame({
+        "列名": [str(column) for column in df.columns],
+        "类型": df.dtypes.astype(str).to_numpy(),
+        "非空数": non_null,
+        "空值数": len(df) - non_null,
+    })
+
+
+def load_table(path, sheet_name=None, cache=None):
+    """按扩展名读取 xlsx/xls/csv 文件（xlsx/xls 默认第一个 Sheet），提供 cache 时复用列式缓存"""
+    path = Path(path)
+    file_extension = path.suffix.lstrip('.').lower()
+    if file_extension in ['xlsx', 'xls']:
+        parse = lambda: pd.read_excel(path, sheet_name=sheet_name if sheet_name is not None else 0)
+    elif file_extension == 'csv':
+        parse = lambda: pd.read_csv(path)
+    else:
+        raise ValueError(f"不支持的文件类型：{path.name}")
+    if cache is None:
+        return parse()
+    return cache.get_or_parse(path.read_bytes(), sheet_name, parse)
+
+
+def _unique_headers(header, width):
+    """表头与 pd.read_excel 保持一致：空表头为 "Unnamed: n"，重复表头依次加 ".1"、".2" 后缀"""
+    header = list(header)[:width] + [None] * (width - len(header))
+    columns = []
+    seen = {}
+    for position, name in enumerate(header):
+        name = f"Unnamed: {position}" if name is None else name
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        columns.append(f"{name}.{count}" if count else name)
+    return columns
+
+
+def _read_value(value):
+    """空单元格及默认缺失值文本与 pd.read_excel 一样读为 NaN"""
+    if value is None or (isinstance(value, str) and value in DEFAULT_NA_TEXTS):
+        return np.nan
+    return value
+
+
+def workbook_sheet_names(source):
+    """只读方式列出工作簿的 Sheet 名称，不解析单元格"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+        if hasattr(source, "seek"):
+            source.seek(0)
+
+
+def iter_table_chunks(source, file_name, sheet_name=None, chunk_size=STREAM_CHUNK_SIZE):
+    """按块读取 xlsx（openpyxl 只读模式 iter_rows）或 csv（pandas chunksize），每块为一个 DataFrame
+
+    xls 格式 openpyxl 无法读取，整表读入后再分块。
+    """
+    if hasattr(source, "seek"):
+        source.seek(0)
+    file_extension = file_name.split('.')[-1].lower()
+    if file_extension == 'csv':
+        yield from pd.read_csv(source, chunksize=chunk_size)
+    elif file_extension == 'xlsx':
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            worksheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+            rows = worksheet.iter_rows(values_only=True)
+            header = next(rows, ())
+            width = max(len(header), worksheet.max_column or 0)
+            columns = _unique_headers(header, width)
+            buffer = []
+            # 空行只计数，后面出现数据时才补入（与 pd.read_excel 一样丢弃表尾空行）
+            blank_rows = 0
+            for values in rows:
+                if all(value is None for value in values):
+                    blank_rows += 1
+                    continue
+                buffer.extend([(np.nan,) * width] * blank_rows)
+                blank_rows = 0
+                buffer.append(tuple(_read_value(value) for value in values[:width]) + (np.nan,) * (width - len(values)))
+                if len(buffer) >= chunk_size:
+                    yield pd.DataFrame(buffer, columns=columns)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame(buffer, columns=columns)
+        finally:
+            workbook.close()
+    elif file_extension == 'xls':
+        df = pd.read_excel(source, sheet_name=sheet_name or 0)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size].reset_index(drop=True)
+    else:
+        raise ValueError("不支持的文件类型")
+
+
+def _cell_value(value):
+    """转换为 xlsxwriter 可直接写入的值（与 DataFrame.to_excel 一致）：缺失值写空单元格，
+    numpy 标量转为 Python 标量，无穷大写为 "inf"/"-inf" 文本"""
+    if value is None or (not isinstance(value, str) and pd.api.types.is_scalar(value) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, float) and np.isinf(value):
+        return "inf" if value > 0 else "-inf"
+    return value
+
+
+class ChunkedResultWriter:
+    """按块追加写出结果，已写出的块不再保留在内存中
+
+    target 为 .csv 路径时直接追加写入；为 .parquet 路径时每块写为一个行组，各块的列类型可能不同
+    （如某列在前几块中全为空），因此各列统一按文本保存（空值保持为空）；其余路径或文件对象（如 BytesIO）
+    写为 xlsx，使用 xlsxwriter 的 constant_memory 模式逐行写出，单元格值与日期格式与 DataFrame.to_excel 相同。
+    """
+
+    def __init__(self, target, sheet_name="Sheet1"):
+        self.rows = 0
+        self._header = None
+        path = str(target).lower() if isinstance(target, (str, os.PathLike)) else ""
+        self._file = None
+        self._workbook = None
+        self._parquet_target = None
+        self._parquet_writer = None
+        if path.endswith(".csv"):
+            self._file = open(target, "w", encoding="utf-8-sig", newline="")
+        elif path.endswith(".parquet"):
+            self._parquet_target = target
+        else:
+            import xlsxwriter
+
+            self._workbook = xlsxwriter.Workbook(target, {"constant_memory": True})
+            self._worksheet = self._workbook.add_worksheet(sheet_name)
+            self._datetime_format = self._workbook.add_format({"num_format": "YYYY-MM-DD HH:MM:SS"})
+            self._date_format = self._workbook.add_format({"num_format": "YYYY-MM-DD"})
+
+    def write(self, df):
+        if self._header is None:
+            self._header = list(df.columns)
+            if self._workbook is not None:
+                self._worksheet.write_row(0, 0, [_cell_value(column) for column in self._header])
+        if self._file is not None:
+            df.to_csv(self._file, header=self.rows == 0, index=False)
+            self.rows += len(df)
+            return
+        if self._parquet_target is not None:
+            self._write_parquet(df)
+            self.rows += len(df)
+            return
+        for values in df.itertuples(index=False, name=None):
+            self.rows += 1
+            for column, value in enumerate(values):
+                value = _cell_value(value)
+                if isinstance(value, datetime.datetime):
+                    self._worksheet.write_datetime(self.rows, column, value, self._datetime_format)
+                elif isinstance(value, datetime.date):
+                    self._worksheet.write_datetime(self.rows, column, value, self._date_format)
+                else:
+                    self._worksheet.write(self.rows, column, value)
+
+    def _write_parquet(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = [str(column) for column in self._header]
+        arrays = [
+            pa.array(df.iloc[:, position].astype(object).map(lambda value: None if _cell_value(value) is None else str(value)), type=pa.string())
+            for position in range(len(columns))
+        ]
+        table = pa.Table.from_arrays(arrays, names=columns)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self._parquet_target, table.schema)
+        self._parquet_writer.write_table(table)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._workbook is not None:
+            self._workbook.close()
+        if self._parquet_target is not None:
+            if self._parquet_writer is None:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                # 没有写入任何块时也生成（空的）结果文件
+                self._parquet_writer = pq.ParquetWriter(self._parquet_target, pa.schema([]))
+            self._parquet_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def stream_mpd_evaluation(chunks, writer, selection, mod_sb_index, group_results, maintenance_projects=None, cache=None, workers=1, progress=None):
+    """逐块判断 MPD 并立即写出，峰值内存只与块大小有关，与文件总行数无关
+
+    maintenance_projects 为 summarize_maintenance_projects 的结果，提供时同时写出维修方案评估列；
+    workers > 1 时整个流式评估共用一个进程池，各块不再各自启动进程。
+    progress(已处理行数) 在每块写出后调用。返回处理的总行数。
+    """
+    executor = evaluation_executor("APPLICABILITY", selection, mod_sb_index, group_results, workers) if workers > 1 else None
+    rows_done = 0
+    try:
+        for chunk in chunks:
+            if "APPLICABILITY" not in chunk.columns:
+                raise ValueError("MPD文件中缺少必要的'APPLICABILITY'列。")
+            chunk[["MPD判断明细", "MPD判断明细结果"]] = evaluate_mpd_frame(chunk, selection, mod_sb_index, group_results, cache, workers, executor=executor)
+            if maintenance_projects is not None and "TASK NUMBER" in chunk.columns:
+                chunk = apply_maintenance_projects(chunk, maintenance_projects)
+            with current_profiler().stage("stream.write", len(chunk)):
+                writer.write(chunk)
+            rows_done += len(chunk)
+            if progress is not None:
+                progress(rows_done)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return rows_done
+
+
+class JobCancelled(Exception):
+    """后台任务被取消：由任务的进度回调抛出，评估在下一次报告进度时停止"""
+
+
+# 后台任务状态
+JOB_PENDING = "排队中"
+JOB_RUNNING = "运行中"
+JOB_DONE = "已完成"
+JOB_CANCELLED = "已取消"
+JOB_FAILED = "失败"
+
+
+class Job:
+    """一个后台评估任务：进度（已完成行数/总行数）、状态、结果或错误信息
+
+    提交时开启了性能分析的任务使用自己的 Profiler，结束后的统计保存在 profile 中（Profiler.report() 的结果）。
+    任务中用 job_output_path 创建的文件记录在 files 中，任务未成功结束或从 JobRunner 中删除时一并删除。
+    """
+
+    def __init__(self, job_id, label):
+        self.id = job_id
+        self.label = label
+        self.status = JOB_PENDING
+        self.done = 0
+        self.total = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.profile = None
+        self.files = []
+        self._cancel_event = threading.Event()
+        self._future = None
+
+    def progress(self, done, total=None):
+        """评估过程中报告进度；任务已被取消时抛出 JobCancelled"""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+        self.done = done
+        if total is not None:
+            self.total = total
+
+    def discard_files(self):
+        """删除任务创建的文件"""
+        for path in self.files:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.files = []
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def is_finished(self):
+        return self.status in (JOB_DONE, JOB_CANCELLED, JOB_FAILED)
+
+    @property
+    def fraction(self):
+        if self.status == JOB_DONE:
+            return 1.0
+        return min(self.done / self.total, 1.0) if self.total else 0.0
+
+    @property
+    def eta(self):
+        """按已完成行数的平均速度估计的剩余秒数，尚无进度时为 None"""
+        if self.status != JOB_RUNNING or not self.done or not self.total:
+            return None
+        elapsed = time.time() - self.started
+        return elapsed * (self.total - self.done) / self.done
+
+
+# 当前上下文中运行的后台任务（JobRunner 在任务的上下文副本中设置），未在任务中运行时为 None
+_current_job = contextvars.ContextVar("workflow_job", default=None)
+
+
+def job_output_path(suffix=""):
+    """创建一个空的输出文件并返回路径；在后台任务中调用时文件归该任务所有，随任务删除，否则由调用方删除"""
+    handle, path = tempfile.mkstemp(suffix=suffix, prefix="workflow_job_")
+    os.close(handle)
+    job = _current_job.get()
+    if job is not None:
+        job.files.append(path)
+    return path
+
+
+class JobRunner:
+    """后台评估任务：在线程池中运行，任务状态与结果保存在模块级实例中
+
+    页面重跑（包括任何控件操作）不会中断已提交的任务，重跑后仍可查询进度、取消任务或取回结果；
+    多个任务（如多架飞机的评估）并行运行。只保留最近 history_size 个已结束的任务。
+    """
+
+    def __init__(self, max_workers=JOB_MAX_WORKERS, history_size=JOB_HISTORY_SIZE):
+        self.history_size = history_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="workflow-job")
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, label, fn, *args, **kwargs):
+        """提交任务 fn(*args, progress=..., **kwargs)，返回 Job；fn 的返回值保存为 Job.result
+
+        任务在提交时的上下文副本中运行；提交者（如页面会话）开启了性能分析时，任务另用一个 Profiler 统计，
+        提交者之后清空或关闭自己的 Profiler 不影响任务的统计。
+        """
+        with self._lock:
+            job = Job(str(next(self._ids)), label)
+            self._jobs[job.id] = job
+            self._prune()
+        job._future = self._executor.submit(contextvars.copy_context().run, self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancel_requested:
+            job.status = JOB_CANCELLED
+            job.finished = time.time()
+            return
+        job.status = JOB_RUNNING
+        job.started = time.time()
+        _current_job.set(job)
+        profiler = use_profiler(Profiler(True)) if current_profiler().enabled else None
+        try:
+            job.result = fn(*args, progress=job.progress, **kwargs)
+            job.status = JOB_DONE
+        except JobCancelled:
+            job.status = JOB_CANCELLED
+        except Exception as error:
+            job.error = f"{type(error).__name__}: {error}"
+            job.status = JOB_FAILED
+        finally:
+            if profiler is not None:
+                job.profile = profiler.report()
+            if job.status != JOB_DONE:
+                job.discard_files()
+            job.finished = time.time()
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        """全部任务，按提交顺序排列"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def active(self):
+        """是否有尚未结束的任务"""
+        return any(not job.is_finished for job in self.jobs())
+
+    def cancel(self, job_id):
+        """请求取消任务：排队中的任务不再运行，运行中的任务在下一次报告进度时停止"""
+        job = self.get(job_id)
+        if job is not None and not job.is_finished:
+            job._cancel_event.set()
+            if job._future is not None and job._future.cancel():
+                job.status = JOB_CANCELLED
+                job.finished = time.time()
+
+    def remove(self, job_id):
+        """删除已结束的任务及其结果与文件"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.is_finished:
+                del self._jobs[job_id]
+                job.discard_files()
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.is_finished]
+        for job in sorted(finished, key=lambda job: job.finished)[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[job.id]
+            job.discard_files()
+
+
+job_runner = JobRunner()
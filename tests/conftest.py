@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 各模块位于仓库根目录（未打包），测试时从根目录导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from CondaEngine import STATS_CHUNK_ROWS, DarStore, calculate_limited_param_stats, limited_param_file_stats
+
+
+def write_dar_csv(path, df):
+    """按 DAR 原始 CSV 的格式写出：前 7 行为文件信息，第 8 行为参数名称，之后 3 行为单位等说明"""
+    with open(path, "w", encoding="gbk", newline="") as output:
+        output.write("\n".join([f"info {i}" for i in range(7)] + [",".join(df.columns)] + ["unit"] * 3) + "\n")
+        df.to_csv(output, header=False, index=False)
+
+
+def flight(rows, seed, late_text=None):
+    """LIM/FLAG 在第一块中全为整数；late_text 给出时在第一块之后写入一个文本值，整表读取时该列为文本"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "LIM": rng.integers(0, 3, rows).astype(object),
+        "P": rng.normal(600, 5, rows).round(4),
+        "FLAG": rng.integers(0, 2, rows).astype(object),
+    })
+    if late_text is not None:
+        # 文本值所在的行不参与限定参数筛选
+        df.loc[STATS_CHUNK_ROWS + 100, "LIM"] = 0
+        df.loc[STATS_CHUNK_ROWS + 100, late_text] = "x"
+    return df
+
+
+@pytest.mark.parametrize("late_text", ["LIM", "FLAG"])
+def test_limited_param_stats_match_whole_file_read(tmp_path, late_text):
+    df = flight(STATS_CHUNK_ROWS + 5000, 1, late_text)
+    path = tmp_path / "flight2.csv"
+    write_dar_csv(path, df)
+
+    store_off = limited_param_file_stats(path, "P", "LIM", "1", None, group_param_name="FLAG")
+    store_on = limited_param_file_stats(path, "P", "LIM", "1", DarStore(tmp_path / "store"), group_param_name="FLAG")
+
+    matched = df[df["LIM"].astype(str) == "1"]
+    for stats, error, accumulators in [store_off, store_on]:
+        assert error is None
+        assert stats["平均值"] == pytest.approx(matched["P"].mean(), rel=1e-12)
+        assert stats["方差"] == pytest.approx(matched["P"].var(), rel=1e-9)
+        assert accumulators[None].count == len(matched)
+        assert sorted(key for key in accumulators if key is not None) == ["0", "1"]
+        assert accumulators["0"].count == int((matched["FLAG"].astype(str) == "0").sum())
+    assert store_off[0] == store_on[0]
+
+
+def test_group_rows_merge_across_chunks_and_files(tmp_path):
+    folder = tmp_path / "flights"
+    folder.mkdir()
+    # 第一个文件 FLAG 读为整数，第二个文件 FLAG 含文本，读为 "0"/"1"
+    first, second = flight(STATS_CHUNK_ROWS + 5000, 2), flight(STATS_CHUNK_ROWS + 5000, 3, "FLAG")
+    write_dar_csv(folder / "B-1001_a.csv", first)
+    write_dar_csv(folder / "B-1002_b.csv", second)
+
+    results, errors = calculate_limited_param_stats(folder, "P", "LIM", "1", None, group_param_name="FLAG")
+
+    assert errors == []
+    group_rows = [row for row in results if row["文件名"].startswith("FLAG = ")]
+    assert [row["文件名"] for row in group_rows] == ["FLAG = 0", "FLAG = 1"]
+    both = pd.concat([first[first["LIM"] == 1], second[second["LIM"] == 1]])
+    assert group_rows[0]["数量"] == int((both["FLAG"].astype(str) == "0").sum())
+    assert group_rows[0]["数量"] + group_rows[1]["数量"] == len(both)
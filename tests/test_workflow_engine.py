@@ -0,0 +1,172 @@
+import os
+
+import pandas as pd
+import pytest
+
+import WorkFlowEngine
+from WorkFlowEngine import (CONFIG_APPLICABLE, CONFIG_NOT_APPLICABLE, FLEET_ENGINE_MODEL, FLEET_ENGINE_SUBMODEL, FLEET_PLANE_MODEL, FLEET_PLANE_SUBMODEL,
+                            FLEET_REGISTRATION, JOB_FAILED, MP_DECISIONS, MPD_APPLICABLE, MPD_NOT_APPLICABLE, ApplicabilityStore, JobRunner, ModSbIndex,
+                            compile_configuration_formula, compile_mpd_applicability, duplicate_registrations, evaluate_configuration_frame, evaluate_fleet,
+                            evaluate_maintenance_statement, evaluate_mpd_frame, evaluate_mpd_frame_stored, evaluation_executor, job_output_path, run_configuration_formula,
+                            run_mpd_applicability)
+
+SELECTION = ("A320", "None", "CFM56-5", "CFM56-5B")
+GROUP_RESULTS = {"PRE-SPR-CURVE": CONFIG_APPLICABLE, "POST-SPR-CURVE": CONFIG_NOT_APPLICABLE}
+
+# (构型差异公式, 是否适用)：机型按包含匹配；MOD 清单为 12345，SB 清单为 72-0001
+CONFIGURATION_CASES = [
+    ("A320", True),
+    ("A321", False),
+    ("CFM56-5B", True),
+    ("A320\nPW1100G", False),
+    ("A321\nOR\nA320", True),
+    ("A321\n OR \nA320", True),
+    ("A321\nOR\nPW1100G", False),
+    ("POST 12345", True),
+    ("PRE 12345", False),
+    ("PRE 99999", True),
+    ("POST 99999\n(72-0001)", True),
+    ("POST 99999\n(72-0002)", False),
+    ("POST 99999\n(72-0001) FOR REF", True),
+    ("POST 12345\n(72-0002)", True),
+]
+
+# (APPLICABILITY, 是否适用)：机型按去除空格后完全一致匹配，ALL 直接成立，SPR 曲线取 GROUP_RESULTS
+MPD_CASES = [
+    ("ALL", True),
+    ("INSTALLED", False),
+    ("A320", True),
+    (" A320 ", True),
+    ("A321", False),
+    ("CFM56-5B", True),
+    ("A320\nPW1100G", False),
+    ("A321\nOR\nA320", True),
+    ("A321\n OR \nA320", True),
+    ("A321\nOR\nA319", False),
+    ("POST 12345", True),
+    ("PRE 12345", False),
+    ("PRE 99999", True),
+    ("POST 99999\n(72-0001)", True),
+    ("POST 99999\n(72-0002)", False),
+    ("POST 99999\n(72-0001) FOR REF", True),
+    ("POST 12345\n(72-0002)", True),
+    ("PRE-SPR-CURVE", True),
+    ("POST-SPR-CURVE", False),
+    ("A321\nOR\nPRE-SPR-CURVE", True),
+]
+
+
+def mod_sb_index():
+    return ModSbIndex(["12345"], ["72-0001"])
+
+
+def test_maintenance_statement_with_empty_sheet():
+    # 只有表头的维修方案读入后两列均为 float64
+    maintenance_df = pd.DataFrame({"项目号": pd.Series([], dtype=float), "飞机明细": pd.Series([], dtype=float)})
+    mpd_df = pd.DataFrame({"TASK NUMBER": ["200101-01"], "MPD判断明细结果": [MPD_NOT_APPLICABLE]})
+
+    result = evaluate_maintenance_statement(mpd_df, maintenance_df, "B-1234")
+
+    assert result["飞机明细是否包含"].tolist() == ["否"]
+    assert result["营运人是否有此条目"].tolist() == ["否"]
+    assert result["MP判断结果"].tolist() == [MP_DECISIONS[0]]
+
+
+def test_fleet_rejects_duplicate_registrations():
+    fleet_df = pd.DataFrame({
+        FLEET_REGISTRATION: ["B-1234", "B-5678", "B-1234 "],
+        FLEET_PLANE_MODEL: ["A320"] * 3,
+        FLEET_PLANE_SUBMODEL: ["None"] * 3,
+        FLEET_ENGINE_MODEL: ["CFM56-5"] * 3,
+        FLEET_ENGINE_SUBMODEL: ["CFM56-5B", "CFM56-5B", "CFM56-5A"],
+    })
+    mpd_df = pd.DataFrame({"TASK NUMBER": ["200101-01"], "APPLICABILITY": ["ALL"]})
+
+    assert duplicate_registrations(fleet_df) == ["B-1234"]
+    with pytest.raises(ValueError, match="B-1234"):
+        evaluate_fleet(fleet_df, None, mpd_df, ModSbIndex())
+
+
+def test_store_ignores_results_of_other_engine_version(tmp_path, monkeypatch):
+    store = ApplicabilityStore(tmp_path / "applicability.sqlite")
+    mpd_df = pd.DataFrame({"TASK NUMBER": ["200101-01", "200102-01"], "APPLICABILITY": ["ALL", "A320"]})
+    selection = ("A320", "None", "CFM56-5", "CFM56-5B")
+    calls = []
+
+    def evaluate(frame, progress=None):
+        calls.append(len(frame))
+        return evaluate_mpd_frame(frame, selection, ModSbIndex(), {})
+
+    first = evaluate_mpd_frame_stored(mpd_df, selection, ModSbIndex(), {}, store, evaluate)
+    evaluate_mpd_frame_stored(mpd_df, selection, ModSbIndex(), {}, store, evaluate)
+    assert calls == [2]
+
+    monkeypatch.setattr(WorkFlowEngine, "ENGINE_VERSION", WorkFlowEngine.ENGINE_VERSION + 1)
+    second = evaluate_mpd_frame_stored(mpd_df, selection, ModSbIndex(), {}, store, evaluate)
+    assert calls == [2, 2]
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_job_files_are_deleted_with_the_job():
+    runner = JobRunner(max_workers=1, history_size=1)
+
+    def write_output(text, progress):
+        path = job_output_path(".csv")
+        with open(path, "w", encoding="utf-8") as output_file:
+            output_file.write(text)
+        if text == "fail":
+            raise ValueError(text)
+        return path
+
+    kept = runner.submit("ok", write_output, "ok")
+    kept._future.result()
+    failed = runner.submit("fail", write_output, "fail")
+    failed._future.result()
+    assert failed.status == JOB_FAILED and failed.files == []
+    assert os.path.exists(kept.result) and kept.files == [kept.result]
+
+    runner.remove(kept.id)
+    assert not os.path.exists(kept.result)
+    assert runner.get(kept.id) is None
+
+
+@pytest.mark.parametrize("formula, applicable", CONFIGURATION_CASES)
+def test_configuration_formula_verdicts(formula, applicable):
+    index = mod_sb_index()
+    _, verdict = run_configuration_formula(compile_configuration_formula(formula), *SELECTION, index.mod_found, index.sb_found)
+
+    assert verdict == (CONFIG_APPLICABLE if applicable else CONFIG_NOT_APPLICABLE)
+
+
+@pytest.mark.parametrize("applicability, applicable", MPD_CASES)
+def test_mpd_applicability_verdicts(applicability, applicable):
+    index = mod_sb_index()
+    _, verdict = run_mpd_applicability(compile_mpd_applicability(applicability), *SELECTION, index.mod_found, index.sb_found, GROUP_RESULTS)
+
+    assert verdict == (MPD_APPLICABLE if applicable else MPD_NOT_APPLICABLE)
+
+
+def test_parallel_evaluation_matches_sequential(monkeypatch):
+    # 每条用例加上一个不成立的 OR 分支得到不同的公式文本，判断结果与原用例相同
+    monkeypatch.setattr(WorkFlowEngine, "PARALLEL_MIN_FORMULAS", 10)
+    monkeypatch.setattr(WorkFlowEngine, "PARALLEL_CHUNK_SIZE", 7)
+    pool_workers = []
+
+    def executor(kind, selection, mod_sb_index, group_results, workers):
+        pool_workers.append(workers)
+        return evaluation_executor(kind, selection, mod_sb_index, group_results, workers)
+
+    monkeypatch.setattr(WorkFlowEngine, "evaluation_executor", executor)
+    config_df = pd.DataFrame({"CONFIGURATION FORMULA": [f"{formula}\nOR\nGRP-{n}" for n in range(3) for formula, _ in CONFIGURATION_CASES] * 2})
+    mpd_df = pd.DataFrame({"APPLICABILITY": [f"{text}\nOR\nGRP-{n}" for n in range(3) for text, _ in MPD_CASES] * 2})
+
+    sequential = evaluate_configuration_frame(config_df, SELECTION, mod_sb_index(), workers=1)
+    parallel = evaluate_configuration_frame(config_df, SELECTION, mod_sb_index(), workers=2)
+    pd.testing.assert_frame_equal(sequential, parallel)
+    assert sequential["构型差异判断结果"].eq(CONFIG_APPLICABLE).tolist() == [applicable for _ in range(3) for _, applicable in CONFIGURATION_CASES] * 2
+
+    sequential = evaluate_mpd_frame(mpd_df, SELECTION, mod_sb_index(), GROUP_RESULTS, workers=1)
+    parallel = evaluate_mpd_frame(mpd_df, SELECTION, mod_sb_index(), GROUP_RESULTS, workers=2)
+    pd.testing.assert_frame_equal(sequential, parallel)
+    assert sequential["MPD判断明细结果"].eq(MPD_APPLICABLE).tolist() == [applicable for _ in range(3) for _, applicable in MPD_CASES] * 2
+    assert pool_workers == [2, 2]